@@ -1,11 +1,11 @@
 import cProfile
 import io
+import os
 import pstats
+import time
+from contextlib import nullcontext
 from biocypher import BioCypher
 
-import os
-import requests
-
 from metalinks.adapters.hmdb_adapter import (
     HMDBAdapter,
     HMDBEdgeType,
@@ -45,6 +45,7 @@ from metalinks.adapters.rhea_adapter import (
     RheaAdapter,
     RheaEdgeType,
     RheaMetaboliteToProteinEdgeField,
+    RHEA_REACTIONS_PATH,
 )
 
 from metalinks.adapters.cellphone_metabolites_adapter import (
@@ -72,7 +73,30 @@ from metalinks.adapters.scconnect_adapter import (
     ScconnectMetaboliteToProteinEdgeField,
 )
 
+from metalinks.build.cache import BuildCache
+from metalinks.build.download import download_files
+from metalinks.build.neo4j_csv import CsvSettings, FrameWriter
+from metalinks.build.pipeline import Stage, run_stages, run_stages_parallel
+from metalinks.build.report import RunReport
+from metalinks.mapping.index import get_mapping_index
+from metalinks.parsers.hmdb_metabolites import (
+    HMDB_METABOLITES_PATH,
+    HMDB_METABOLITES_URL,
+)
+from metalinks.parsers.rhea import RHEA_REACTIONS_URL
+
 PROFILE = False
+BIOCYPHER_CONFIG_PATH = "config/biocypher_config.yaml"
+OUTPUT_DIR = "biocypher-out"  # a timestamped directory per run is created in it
+PARALLEL = False  # run adapters in a process pool
+N_WORKERS = None  # pool size in parallel mode, defaults to one per adapter
+BUILD_CACHE_DIR = ".build_cache"  # set to None to disable the build cache
+REFRESH_CACHE = False  # recompute all adapters, overwriting cached output
+REPORT_DIR = "biocypher-out"  # per-stage run report, set to None to disable
+COLUMNAR = True  # write adapter frames directly to the import CSVs
+STITCH_AGGREGATE = False  # one STITCH edge per metabolite-protein pair, not per mode
+HMDB_PARSE_WORKERS = 1  # HMDB XML parser processes, 0 for one per CPU (nested in the PARALLEL pool)
+RHEA_PARSE_WORKERS = 1  # Rhea reaction parser processes, 0 for one per CPU (nested in the PARALLEL pool)
 
 hmdb_node_types = [
     HMDBNodeType.METABOLITE,
@@ -181,6 +205,13 @@ stitch_edge_fields = [
     STITCHMetaboliteToProteinEdgeField.REFERENCES,
 ]
 
+# only aggregated STITCH edges carry these
+if STITCH_AGGREGATE:
+    stitch_edge_fields += [
+        STITCHMetaboliteToProteinEdgeField.MODES,
+        STITCHMetaboliteToProteinEdgeField.SIGN,
+    ]
+
 
 recon_edge_fields = [
     ReconMetaboliteToProteinEdgeField._PRIMARY_SOURCE_ID,
@@ -251,40 +282,20 @@ scconnect_edge_fields = [
 ]
 
 
-def download_files(file_mappings):
-    """
-    Download cached files from Zenodo and store them in the given paths.
-
-    Parameters
-        file_mappings: A dictionary where keys are URLs and values are the local file paths to store the downloaded files.
-    """
-    for url, path in file_mappings.items():
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-
-        # Skip downloading if the file already exists
-        if os.path.exists(path):
-            print(f"File already exists: {path}")
-            continue
-
-        # Download the file
-        response = requests.get(url, allow_redirects=True)
-        if response.status_code == 200:
-            with open(path, "wb") as file:
-                file.write(response.content)
-            print(f"Downloaded and saved: {path}")
-        else:
-            print(f"Failed to download {url}")
-
-
 # Define the mappings of URLs to local storage paths
 # TODO replace with BioCypher Resource classes (need to implement requests with parameters)
 file_mappings = {
     "https://zenodo.org/records/10200150/files/9606.actions.v5.0.tsv?download=1": ACTIONS_PATH,
     "https://zenodo.org/records/10200150/files/9606.protein_chemical.links.detailed.v5.0.tsv?download=1": DETAILS_PATH,
     "https://zenodo.org/records/10200150/files/metmap_curated.csv?download=1": METMAP_PATH,
+    HMDB_METABOLITES_URL: HMDB_METABOLITES_PATH,
+    RHEA_REACTIONS_URL: RHEA_REACTIONS_PATH,
 }
 
+# files the build can go on without; the Rhea adapter falls back to an
+# uncompressed rhea-reactions.txt
+OPTIONAL_DOWNLOADS = [RHEA_REACTIONS_PATH]
+
 
 def main():
     """
@@ -300,21 +311,37 @@ def main():
     # ACTUAL CODE #
     ###############
 
+    report = RunReport() if REPORT_DIR else None
+
     # download cached files
-    download_files(file_mappings)
+    with report.block("download_files") if report else nullcontext():
+        download_files(file_mappings, optional=OPTIONAL_DOWNLOADS)
 
+    # the output directory is fixed here so the columnar writer knows it
+    output_directory = os.path.join(OUTPUT_DIR, time.strftime("%Y%m%d%H%M%S"))
     bc = BioCypher(
-        biocypher_config_path="config/biocypher_config.yaml",
+        biocypher_config_path=BIOCYPHER_CONFIG_PATH,
+        output_directory=output_directory,
     )
+    frame_writer = None
+    if COLUMNAR:
+        frame_writer = FrameWriter(
+            bc, CsvSettings.from_config(BIOCYPHER_CONFIG_PATH, output_directory)
+        )
 
     # check schema
     bc.show_ontology_structure()
 
+    # identifier mapping index shared by the adapters, built once per release
+    with report.block("get_mapping_index") if report else nullcontext():
+        get_mapping_index()
+
     # create adapter
     HMDB = HMDBAdapter(
         node_types=hmdb_node_types,
         node_fields=hmdb_node_fields,
         test_mode=True,
+        parse_workers=HMDB_PARSE_WORKERS,
     )
 
     UNIPROT = Uniprot(
@@ -324,17 +351,20 @@ def main():
         test_mode=False,
     )
 
-    UNIPROT.download_uniprot_data(
-        cache=True,
-        retries=5,
-    )
+    with report.block("Uniprot.download_uniprot_data") if report else nullcontext():
+        UNIPROT.download_uniprot_data(
+            cache=True,
+            retries=5,
+        )
 
     STITCH = STITCHAdapter(
         edge_types=stitch_edge_types,
         edge_fields=stitch_edge_fields,
         test_mode=False,
+        aggregate=STITCH_AGGREGATE,
     )
 
+    # one stage per model, each cached and reported on its own
     RECON = ReconAdapter(
         edge_types=recon_edge_types,
         edge_fields=recon_edge_fields,
@@ -351,6 +381,7 @@ def main():
         edge_types=rhea_edge_types,
         edge_fields=rhea_edge_fields,
         test_mode=True,
+        parse_workers=RHEA_PARSE_WORKERS,
     )
 
     CELLPHONE = CellphoneAdapter(
@@ -378,22 +409,44 @@ def main():
     )
 
     # write nodes and edges to csv
-    bc.write_nodes(HMDB.get_nodes())
-    bc.write_edges(CELLPHONE.get_edges())
-    bc.write_edges(NEURONCHAT.get_edges())
-    bc.write_edges(CELLINKER.get_edges())
-    bc.write_edges(SCCONNECT.get_edges())
-    bc.write_edges(STITCH.get_edges())  # high RAM, thus attention at the beginning
-    bc.write_edges(RECON.get_edges())
-    bc.write_edges(HMR.get_edges())
-    bc.write_edges(RHEA.get_edges())
-    bc.write_edges(HMDB.get_edges())
-    bc.write_nodes(UNIPROT.get_nodes())
+    nodes = "get_nodes_frame" if COLUMNAR else "get_nodes"
+    edges = "get_edges_frame" if COLUMNAR else "get_edges"
+    stages = [
+        Stage("nodes", HMDB, nodes),
+        Stage("edges", CELLPHONE, edges),
+        Stage("edges", NEURONCHAT, edges),
+        Stage("edges", CELLINKER, edges),
+        Stage("edges", SCCONNECT, edges),
+        Stage("edges", STITCH, edges),  # peak RAM bounded by STITCHAdapter.memory_budget
+        Stage("edges", RECON, edges),
+        Stage("edges", HMR, edges),
+        Stage("edges", RHEA, edges),
+        Stage("edges", HMDB, edges),
+        Stage("nodes", UNIPROT, "get_nodes"),
+    ]
+
+    cache = None
+    if BUILD_CACHE_DIR:
+        cache = BuildCache(BUILD_CACHE_DIR, refresh=REFRESH_CACHE)
+
+    if PARALLEL:
+        run_stages_parallel(
+            bc, stages, max_workers=N_WORKERS, cache=cache, report=report,
+            frame_writer=frame_writer,
+        )
+    else:
+        run_stages(
+            bc, stages, cache=cache, report=report, frame_writer=frame_writer
+        )
 
     # convenience and stats
     bc.write_import_call()
     bc.summary()
 
+    if report:
+        report.write(REPORT_DIR)
+        print(report.summary())
+
     ######################
     # END OF ACTUAL CODE #
     ######################
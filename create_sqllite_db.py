@@ -4,6 +4,8 @@ import pandas as pd
 import numpy as np
 from ast import literal_eval
 
+from metalinks.mapping.normalize import normalize_frame, normalize_ids
+
 def expand_list_column(df, column_name, pk='hmdb'):
     """
     Expand a list-containing column into a separate DataFrame. Drops the original column from the original DataFrame.
@@ -71,15 +73,16 @@ edges['mor'] = edges['mor'].apply(lambda x: literal_eval(x) if isinstance(x, str
 
 # Create a DataFrame for Sources
 edges = edges.replace(to_replace='"', value='', regex=True)
-edges = edges.explode('source').explode('mor').drop_duplicates()
+edges = edges.explode('source').explode('mor')
+edges = normalize_frame(edges, {'hmdb': 'hmdb', 'uniprot': 'uniprot'}).drop_duplicates()
 
 
 ## Metabolites
 mets = pd.read_csv(path.join('data', 'MetaboliteTable.csv'))
 # TODO: Fix this issue in the Cypher query
-mets['hmdb'] = mets['hmdb'].replace(to_replace='"', value='', regex=True)
+mets['hmdb'] = normalize_ids(mets['hmdb'], 'hmdb')
 mets['metabolite'] = mets['metabolite'].replace(to_replace='"', value='', regex=True)
-mets['pubchem'] = mets['pubchem'].apply(lambda x: '' if np.isnan(x) else str(int(x)))
+mets['pubchem'] = normalize_ids(mets['pubchem'], 'pubchem').fillna('')
 mets = mets[mets['hmdb'].isin(edges['hmdb'])].drop_duplicates()
 for column in mets.columns:
     if column not in ['hmdb', 'metabolite', 'pubchem']:
@@ -95,8 +98,7 @@ for column_name in columns_of_interest:
 
 # Proteins
 prots = pd.read_csv(path.join('data', 'ProteinTable.csv'))
-prots['uniprot'] = prots['uniprot'].replace(to_replace='"', value='', regex=True)
-prots['gene_symbol'] = prots['gene_symbol'].replace(to_replace='"', value='', regex=True)
+prots = normalize_frame(prots, {'uniprot': 'uniprot', 'gene_symbol': 'genesymbol'})
 prots = prots[prots['uniprot'].isin(edges['uniprot'])].drop_duplicates()
 
 ### Create the SQL Tables
@@ -173,7 +175,7 @@ from a Metalinks Neo4j dump, available at https://zenodo.org/records/10200150"""
 MATCH (m)-[a]->(p:Protein)
 WHERE 
 type(a) IN ['CellinkerMetaboliteReceptor', 'ScconnectMetaboliteReceptor', 'StitchMetaboliteReceptor', 'NeuronchatMetaboliteReceptor', 'CellphoneMetaboliteReceptor'] 
-AND ((a.database >= 200 OR a.experiment >= 300 OR a.predicted >= 700 OR a.combined_score >= 900) OR
+AND ((a.experiment >= 200 OR a.prediction >= 300 OR a.combined_score >= 900) OR
   (type(a) <> 'StitchMetaboliteReceptor'))
 AND ANY(value in m.cellular_locations WHERE value = 'Extracellular')
 AND ((p.receptor_type in ['catalytic_receptor', 'gpcr', 'nhr']) OR ((p.receptor_type in ['lgic',  'other_ic', 'transporter', 'vgic'] AND a.mode in ['activation', 'inhibition'])))
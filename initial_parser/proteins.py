@@ -1,46 +1,19 @@
-import xml.etree.ElementTree as ET
-import pandas as pd
+import sys
 
+from metalinks.adapters.hmdb_adapter import PROTEIN_MAPPING_PATH
+from metalinks.parsers.hmdb_proteins import (
+    HMDB_PROTEINS_PATH,
+    protein_mapping_table,
+    write_protein_mapping,
+)
 
-in_path = '/home/efarr/Documents/metalinks/Data/Source/HMDB/hmdb_proteins.xml'
-out_path = '/home/efarr/Documents/metalinks/Data/Intermediate/HMDB/hmdb_proteins_test.csv'
 
-tree = ET.parse(in_path)
-root = tree.getroot()
-accession_array = []
-uniprot_array = []
-gene_name_array = []
-metabolite_array = []
-pathway_array = []
-disease_array = []
+# same table as `python -m metalinks.parsers.hmdb_proteins ... --mapping`
+# usage: python initial_parser/proteins.py [in_path] [out_path]
+in_path = sys.argv[1] if len(sys.argv) > 1 else HMDB_PROTEINS_PATH
+out_path = sys.argv[2] if len(sys.argv) > 2 else PROTEIN_MAPPING_PATH
 
-for protein in root.findall('.//{http://www.hmdb.ca}protein'):
-    accession = protein.find('{http://www.hmdb.ca}accession').text
-    gene_name = protein.find('{http://www.hmdb.ca}gene_name').text
-    uniprot = protein.find('{http://www.hmdb.ca}uniprot_id').text
-    metabolites = protein.findall('.//{http://www.hmdb.ca}metabolite_associations/')
-    pathways = protein.findall('.//{http://www.hmdb.ca}pathways/')
-    accession_array.append(accession)
-    l = []
-    s = []
-    for m in metabolites:
-        accession = m.find('{http://www.hmdb.ca}accession').text
-        l.append(accession)
-    for p in pathways:
-        name = p.find('{http://www.hmdb.ca}name').text
-        s.append(name)
-    uniprot_array.append(uniprot)
-    gene_name_array.append(gene_name)
-    metabolite_array.append(l)
-    pathway_array.append(s)
 
+df = protein_mapping_table(in_path)
 
-df = pd.DataFrame({
-    "accession": accession_array,
-    "gene_name": gene_name_array,
-    "metabolites": metabolite_array,
-    "pathways": pathway_array,
-    "uniprot": uniprot_array
-})
-
-df.to_csv(out_path, index=False)
+write_protein_mapping(df, out_path)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Base class of the metalinks adapters.
+
+An adapter builds its output as one data frame per kind, in the layout
+described in `metalinks.build.neo4j_csv`: `id`, `label` (and `source`,
+`target` for edges) plus one column per property. From these frames the
+base class derives
+
+- `get_node_batches` / `get_edge_batches`: the frame in slices of
+  `id_batch_size` rows,
+- `get_nodes` / `get_edges`: the tuple generators BioCypher expects, built
+  from the column arrays of each batch instead of one Series per row.
+"""
+
+from biocypher._logger import logger
+
+from metalinks.build.neo4j_csv import DEFAULT_BATCH_SIZE, iter_batches, iter_records
+
+logger.debug(f"Loading module {__name__}.")
+
+
+class MetalinksAdapter:
+    """
+    Subclasses implement `get_nodes_frame` and/or `get_edges_frame`; an
+    adapter without nodes or edges yields no frames of that kind.
+    """
+
+    id_batch_size = DEFAULT_BATCH_SIZE
+
+    def get_nodes_frame(self):
+        """
+        The nodes as one data frame or an iterable of data frames.
+        """
+
+        return iter(())
+
+    def get_edges_frame(self):
+        """
+        The edges as one data frame or an iterable of data frames.
+        """
+
+        return iter(())
+
+    def get_node_batches(self):
+        """
+        Yield the nodes as data frames of at most `id_batch_size` rows.
+        """
+
+        yield from iter_batches(self.get_nodes_frame(), self.id_batch_size)
+
+    def get_edge_batches(self):
+        """
+        Yield the edges as data frames of at most `id_batch_size` rows.
+        """
+
+        yield from iter_batches(self.get_edges_frame(), self.id_batch_size)
+
+    def get_nodes(self):
+        """
+        Yield (id, label, properties) tuples.
+        """
+
+        for batch in self.get_node_batches():
+            yield from iter_records("nodes", batch, self.id_batch_size)
+
+    def get_edges(self):
+        """
+        Yield (id, source, target, label, properties) tuples.
+        """
+
+        for batch in self.get_edge_batches():
+            yield from iter_records("edges", batch, self.id_batch_size)
@@ -8,16 +8,19 @@ BioCypher - recon adapter prototype
 from enum import Enum
 from typing import Optional
 import pandas as pd
-import numpy as np
-import hashlib
-from tqdm import tqdm
-import numpy as np
-from pypath.utils import mapping
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH, get_mapping_index
+from metalinks.mapping.normalize import normalize_ids
+
 logger.debug(f"Loading module {__name__}.")
 
+CELLINKER_PATH = 'data/Cellinker/human-sMOL.txt'
+
 class CellinkerEdgeType(Enum):
     """
     Cellinker edges.
@@ -40,7 +43,9 @@ class CellinkerMetaboliteToProteinEdgeField(Enum):
     REFERENCES = 'references'
 
 
-class CellinkerAdapter:
+class CellinkerAdapter(MetalinksAdapter):
+
+    input_files = [CELLINKER_PATH, MAPPING_INDEX_PATH]
 
     def __init__(
         self, 
@@ -50,27 +55,26 @@ class CellinkerAdapter:
         test_mode: bool = False,
     ):
         self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "Cellinker"
         self.data_source_version = ""
         self.data_license = 'None'
         self.test_mode = test_mode
 
-    def get_edges(self):
+    def get_edges_frame(self):
         """
         Get edges from Cellinker (curated file)
         """
-        cellinker_path = 'data/Cellinker/human-sMOL.txt'
-        hmdb_mapping = 'data/mapping_tables/hmdb_mapping.csv'
-        
-        cellinker = pd.read_csv(cellinker_path, sep='\t')
-        hmdb = pd.read_csv(hmdb_mapping, sep=',')
+        cellinker = pd.read_csv(CELLINKER_PATH, sep='\t')
+        index = get_mapping_index()
+
+        phase('transform')
         
+        cellinker['ligand_pubchem_cid'] = normalize_ids(cellinker['ligand_pubchem_cid'], 'pubchem')
+        cellinker['Receptor_uniprot'] = normalize_ids(cellinker['Receptor_uniprot'], 'uniprot')
         cellinker = cellinker.dropna(subset=['ligand_pubchem_cid'])
-        hmdb = hmdb.dropna(subset=['pubchem_id'])
-        hmdb_dict = dict(zip(hmdb['pubchem_id'].astype(int), hmdb['accession']))
-        
-        cellinker['ligand_pubchem_cid'] = cellinker['ligand_pubchem_cid'].astype(int)
-        cellinker['HMDB'] = cellinker['ligand_pubchem_cid'].map(hmdb_dict)
+        cellinker['HMDB'] = index.translate(cellinker['ligand_pubchem_cid'], 'pubchem', 'hmdb', canonical=False)
         cellinker.dropna(subset=['HMDB'], inplace=True)
         cellinker.dropna(subset=['Receptor_symbol'], inplace=True)
         cellinker.drop_duplicates(inplace=True)
@@ -79,16 +83,18 @@ class CellinkerAdapter:
         cellinker['references'] = cellinker['references'].str.split(';').apply(lambda x: ['PMID:' + i for i in x])
         
         cellinker.rename(columns={'Receptor_uniprot': 'uniprot'}, inplace=True)
-        
-        for row in cellinker.iterrows():
-            if row[1]['uniprot'] == set():
-                print(row[1]['Receptor_symbol'])
-                continue
-            attributes  = {
-                'mode': 'activation',
-                'references': row[1]['references']
-            }
-            id = 'uniprot:' + row[1]['uniprot']
-            r = row[1].astype(str)
-            h = hashlib.md5(''.join(r).encode('utf-8')).hexdigest()
-            yield h, row[1]['HMDB'], id, 'CL', attributes
+
+        for symbol in cellinker.loc[cellinker['uniprot'].isna(), 'Receptor_symbol']:
+            print(f"Symbol {symbol} has no valid UniProt accession.")
+        cellinker.dropna(subset=['uniprot'], inplace=True)
+
+        cellinker['edge_id'] = edge_ids(cellinker, ['HMDB', 'uniprot', 'references'], 'CL')
+
+        return pd.DataFrame({
+            'id': cellinker['edge_id'],
+            'source': cellinker['HMDB'],
+            'target': 'uniprot:' + cellinker['uniprot'],
+            'label': 'CL',
+            'mode': 'activation',
+            'references': cellinker['references'],
+        })
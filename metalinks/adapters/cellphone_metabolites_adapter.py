@@ -8,16 +8,19 @@ BioCypher - recon adapter prototype
 from enum import Enum
 from typing import Optional
 import pandas as pd
-import numpy as np
-import hashlib
-from tqdm import tqdm
-import numpy as np
-from pypath.utils import mapping
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH
+from metalinks.mapping.resolve import MISSING_SYMBOLS_PATH, resolve_uniprot
+
 logger.debug(f"Loading module {__name__}.")
 
+CELLPHONE_PATH = 'data/CellphoneDB/Cellphone_suptab4_curated.xlsx'
+
 class CellphoneEdgeType(Enum):
     """
     RECON edge types.
@@ -40,7 +43,9 @@ class CellphoneMetaboliteToProteinEdgeField(Enum):
     REFERENCES = 'references'
 
 
-class CellphoneAdapter:
+class CellphoneAdapter(MetalinksAdapter):
+
+    input_files = [CELLPHONE_PATH, MISSING_SYMBOLS_PATH, MAPPING_INDEX_PATH]
 
     def __init__(
         self, 
@@ -50,39 +55,40 @@ class CellphoneAdapter:
         test_mode: bool = False,
     ):
         self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "RECON"
         self.data_source_version = "3D"
         self.data_license = 'None'
         self.test_mode = test_mode
 
-    def get_edges(self):
+    def get_edges_frame(self):
         """
         Get edges from Cellphone (curated file)
         """
 
-        cpdb = pd.read_excel('data/CellphoneDB/Cellphone_suptab4_curated.xlsx')
+        cpdb = pd.read_excel(CELLPHONE_PATH)
+
+        phase('transform')
+
         cpdb['symbol'] = cpdb['protein_name_b'].str.split('_').str[0]
-        cpdb['uniprot'] = cpdb['symbol'].apply(lambda x: mapping.map_name(x, 'genesymbol', 'uniprot'))
+        cpdb['uniprot'] = resolve_uniprot(cpdb['symbol'])
 
         cpdb.dropna(subset=['symbol', 'Chebi/HMDB_name_a'], inplace=True)
         cpdb.rename(columns={'source': 'references'}, inplace=True)
         cpdb['references'] = cpdb['references'].apply(lambda x: x.split(';'))
 
-        missing_symbols = pd.read_csv('data/mapping_tables/missing_symbols.csv')
-        missing_symbols_dict = dict(zip(missing_symbols['symbol'], missing_symbols['uniprot']))
-
-        for row in cpdb.iterrows():
-            if row[1]['uniprot'] == set():
-                try:
-                    row[1]['uniprot'] = [missing_symbols_dict[row[1]['symbol']]]
-                except:
-                    print(f"Symbol {row[1]['symbol']} not found in mapping tables.")
-                    continue
-            attributes  = {
-                'mode': 'activation',
-                'references': row[1]['references']
-            }
-            id = 'uniprot:' + row[1]['uniprot'].pop()
-            r = row[1].astype(str)
-            h = hashlib.md5(''.join(r).encode('utf-8')).hexdigest()
-            yield h, row[1]['Chebi/HMDB_name_a'], id, 'CP', attributes
+        for symbol in cpdb.loc[cpdb['uniprot'].isna(), 'symbol']:
+            print(f"Symbol {symbol} not found in mapping tables.")
+        cpdb.dropna(subset=['uniprot'], inplace=True)
+
+        cpdb['edge_id'] = edge_ids(cpdb, ['Chebi/HMDB_name_a', 'uniprot', 'references'], 'CP')
+
+        return pd.DataFrame({
+            'id': cpdb['edge_id'],
+            'source': cpdb['Chebi/HMDB_name_a'],
+            'target': 'uniprot:' + cpdb['uniprot'],
+            'label': 'CP',
+            'mode': 'activation',
+            'references': cpdb['references'],
+        })
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Stable edge ids computed from the key columns of an adapter's edge table.
+
+The key columns of all rows are joined into one string column in a single
+vectorized pass, prefixed with a namespace (usually the edge label). The
+id of a row is the 8-byte BLAKE2b digest of its UTF-8 encoded key string
+(`hashlib.blake2b(digest_size=8)`) as 16 hex digits, so it only depends on
+the values of the key columns, not on the pandas or polars version, and
+stays the same between builds.
+"""
+
+from hashlib import blake2b
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+SEPARATOR = "\x1f"
+DIGEST_SIZE = 8
+
+# byte -> its two hex digits
+_HEX = np.frombuffer(
+    "".join(f"{i:02x}" for i in range(256)).encode("ascii"), dtype=np.uint8
+).reshape(256, 2)
+
+
+def _key_strings(df, columns: Sequence[str], namespace: str) -> np.ndarray:
+    """
+    One string per row: the namespace and the key columns, missing values
+    as empty strings.
+    """
+
+    if isinstance(df, pl.DataFrame):
+        keys = df.select(
+            pl.concat_str(
+                [pl.lit(namespace)]
+                + [pl.col(c).cast(pl.Utf8).fill_null("") for c in columns],
+                separator=SEPARATOR,
+            )
+        )
+        return keys.to_series().to_numpy().astype(object, copy=False)
+
+    keys = pd.Series(namespace, index=df.index, dtype="object")
+    for c in columns:
+        col = df[c]
+        keys = keys.str.cat(col.astype(str).where(col.notna(), ""), sep=SEPARATOR)
+    return keys.to_numpy(dtype=object)
+
+
+def _digests(keys: np.ndarray) -> np.ndarray:
+    """
+    BLAKE2b digests of the key strings as unsigned 64-bit integers.
+    """
+
+    digests = b"".join([
+        blake2b(k.encode("utf-8"), digest_size=DIGEST_SIZE).digest()
+        for k in keys
+    ])
+    return np.frombuffer(digests, dtype=">u8").astype(np.uint64)
+
+
+def _hex(hashes: np.ndarray) -> np.ndarray:
+    """
+    Hex strings of unsigned 64-bit hashes, formatted without a Python loop.
+    """
+
+    digits = _HEX[hashes.astype(">u8").view(np.uint8).reshape(-1, 8)]
+    return digits.reshape(-1, 16).view("S16").ravel().astype("U16")
+
+
+def edge_ids(
+    df: Union[pd.DataFrame, pl.DataFrame],
+    columns: Sequence[str],
+    namespace: str = "",
+    name: str = "edge_id",
+) -> Union[pd.Series, pl.Series]:
+    """
+    Edge ids for all rows of a pandas or polars data frame.
+
+    Rows with the same values in `columns` get the same id, and a warning
+    is logged if there are any; distinct keys hashing to the same id are
+    logged as an error.
+
+    Args:
+        df: edge table
+
+        columns: names of the columns identifying an edge
+
+        namespace: prefix hashed with every key, e.g. the edge label, so
+            that the same pair of nodes gets different ids in different
+            sources
+
+        name: name of the returned series
+
+    Returns:
+        series of 16-digit hex ids, aligned with `df`
+    """
+
+    keys = _key_strings(df, columns, namespace)
+    hashes = _digests(keys)
+    ids = _hex(hashes)
+
+    # only rows sharing a hash can share a key or collide
+    shared = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    n_unshared = len(keys) - int(shared.sum())
+    n_keys = n_unshared + len(pd.unique(keys[shared]))
+    duplicates = len(keys) - n_keys
+    if duplicates:
+        logger.warning(
+            f"{duplicates} edges of {namespace or 'unnamed source'} share "
+            f"their key columns {list(columns)} with another edge."
+        )
+    collisions = n_keys - n_unshared - len(pd.unique(hashes[shared]))
+    if collisions:
+        logger.error(
+            f"{collisions} edge id collisions in "
+            f"{namespace or 'unnamed source'}."
+        )
+
+    if isinstance(df, pl.DataFrame):
+        return pl.Series(name, ids, dtype=pl.Utf8)
+    return pd.Series(ids, index=df.index, name=name, dtype="object")
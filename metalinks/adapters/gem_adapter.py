@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Production/degradation edges of genome-scale metabolic models (GEMs).
+
+Every model is described by a `GEMSpec`: where its .mat file, gene symbols
+and metabolite annotations are, how its metabolite ids name compartments,
+how transports are inferred and which label its edges get. `gem_edges`
+turns one spec into metabolite -> protein edges:
+
+- the genes of a reaction produce the metabolites with coefficient 1 and
+  degrade those with coefficient -1 (entries of `rxnGeneMat` and `S`),
+- metabolites are mapped to HMDB through the model annotations, optionally
+  reconciled with further mapping tables (`metalinks.mapping.reconcile`),
+- gene symbols are mapped to UniProt through the mapping index.
+
+`GEMAdapter` builds the edges of several models, each in its own process
+unless it already runs in a worker process. `ReconAdapter` and `HmrAdapter` are the adapters of a single model.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from biocypher._logger import logger
+
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.adapters.transport import (
+    compartment,
+    compartment_pairs,
+    subsystem_transport,
+    transport_direction,
+)
+from metalinks.build.report import add_worker, measured, phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH, get_mapping_index
+from metalinks.mapping.normalize import METABOLITE_ID_COLUMNS, normalize_frame
+from metalinks.mapping.reconcile import reconcile
+from metalinks.parsers.gem import load_gem
+
+logger.debug(f"Loading module {__name__}.")
+
+
+class MappingTable(NamedTuple):
+    """
+    Metabolite id table reconciled with the annotations of a model;
+    `columns` renames its id columns to those of `METABOLITE_ID_COLUMNS`.
+    """
+
+    path: str
+    sep: str = ","
+    columns: Optional[Mapping[str, str]] = None
+
+
+class GEMSpec(NamedTuple):
+    """
+    Declarative description of a model.
+
+    Args:
+        name: edges are labelled `PD_<name>`, with status `<name>`
+
+        path: .mat file of the model, see `metalinks.parsers.gem`
+
+        genes_path: table whose `genes_column` holds the gene symbols, one
+            row per gene of the model, in model order
+
+        compartments: 'brackets' or 'suffix', the compartment syntax of the
+            metabolite ids (see `metalinks.adapters.transport.compartment`)
+
+        transport: 'subsystem' to look transports up by subsystem and
+            compartment, 'pairs' to derive them from the two compartments
+            of a reaction
+
+        metabolites_path: table of metabolite annotations, one row per
+            metabolite of the model, in model order; None to use the
+            annotations of the .mat file
+
+        id_columns: renames the id columns of `metabolites_path` to those of
+            `METABOLITE_ID_COLUMNS`
+
+        mapping_tables: `MappingTable`s reconciled with the annotations, in
+            order of precedence
+    """
+
+    name: str
+    path: str
+    genes_path: str
+    genes_column: str
+    genes_sep: str = ","
+    compartments: str = "brackets"
+    transport: str = "subsystem"
+    metabolites_path: Optional[str] = None
+    metabolites_sep: str = "\t"
+    id_columns: Optional[Mapping[str, str]] = None
+    mapping_tables: Sequence[MappingTable] = ()
+
+    @property
+    def label(self):
+        return f"PD_{self.name}"
+
+    @property
+    def input_files(self):
+        paths = [self.path, self.genes_path, self.metabolites_path]
+        paths += [table.path for table in self.mapping_tables]
+        return [path for path in paths if path]
+
+
+def get_gene_symbols(rxn_gene, reaction_ids, genes):
+    """
+    (reaction_id, gene_id) pairs of the entries equal to 1 of the reactions
+    x genes matrix, in row-major order, without densifying it.
+    """
+
+    m = sparse.coo_matrix(rxn_gene)
+    keep = m.data == 1
+    rows, cols = m.row[keep], m.col[keep]
+    order = np.lexsort((cols, rows))
+    rxn_gene_df = pd.DataFrame({
+        'reaction_id': np.asarray(reaction_ids, dtype=object)[rows[order]],
+        'gene_id': np.asarray(genes, dtype=object)[cols[order]],
+    })
+    rxn_gene_df.drop_duplicates(inplace=True)
+    return rxn_gene_df
+
+
+def get_metabolites(S, mets, reaction_ids, d=1, syntax='brackets'):
+    """
+    (metabolite_id, reaction_id, compartment) of the stoichiometric
+    coefficients equal to `d` of the sparse metabolites x reactions matrix,
+    in row-major order.
+    """
+
+    m = sparse.coo_matrix(S)
+    keep = m.data == d
+    rows, cols = m.row[keep], m.col[keep]
+    order = np.lexsort((cols, rows))
+    S = pd.DataFrame({
+        'metabolite_id': np.asarray(mets, dtype=object)[rows[order]],
+        'reaction_id': np.asarray(reaction_ids, dtype=object)[cols[order]],
+    })
+    S['compartment'] = compartment(S['metabolite_id'], syntax)
+    S.drop_duplicates(inplace=True)
+    return S
+
+
+def get_metabolite_to_gene(reaction_to_metabolites_prod, reaction_to_metabolites_deg, reaction_to_genes, reactions):
+    """
+    Join the produced and degraded metabolites to the genes of their
+    reactions; `reactions` has the columns id, lb, ub.
+    """
+
+    metabolite_to_gene = pd.concat([
+        pd.merge(reaction_to_metabolites_prod, reaction_to_genes, on='reaction_id').assign(direction='producing'),
+        pd.merge(reaction_to_metabolites_deg, reaction_to_genes, on='reaction_id').assign(direction='degrading'),
+    ])
+    reversible = reactions['id'][(reactions['lb'] < 0) & (reactions['ub'] > 0)]
+    metabolite_to_gene['rev'] = np.where(
+        metabolite_to_gene['reaction_id'].isin(reversible), 'reversible', 'irreversible'
+    )
+    return metabolite_to_gene
+
+
+def _read_mapping_table(table: MappingTable) -> pd.DataFrame:
+    df = pd.read_csv(table.path, sep=table.sep, dtype=str)
+    return df.rename(columns=table.columns or {})
+
+
+def get_metabolite_ids(spec: GEMSpec, model) -> pd.DataFrame:
+    """
+    Normalized metabolite ids of a model, one row per metabolite, filled
+    from the mapping tables of the spec.
+    """
+
+    if spec.metabolites_path:
+        annotations = pd.read_csv(spec.metabolites_path, sep=spec.metabolites_sep, dtype=str)
+        annotations = annotations.rename(columns=spec.id_columns or {})
+    else:
+        annotations = model.metabolites
+    if len(annotations) != len(model.metabolites):
+        raise ValueError(
+            f"{spec.name}: {len(annotations)} metabolite annotations "
+            f"for {len(model.metabolites)} metabolites."
+        )
+
+    columns = list(METABOLITE_ID_COLUMNS)
+    ids = normalize_frame(annotations.reindex(columns=columns), METABOLITE_ID_COLUMNS)
+    ids = ids.reset_index(drop=True)
+
+    print('loaded metabolite mapping files')
+
+    if spec.mapping_tables:
+        phase('read')
+        sources = [_read_mapping_table(table) for table in spec.mapping_tables]
+        phase('transform')
+        sources = [normalize_frame(df.reindex(columns=columns), METABOLITE_ID_COLUMNS) for df in sources]
+        reconciled = reconcile(ids, sources)
+        ids = reconciled.ids
+        print(f'filled missing values in metabolite mapping files, {len(reconciled.conflicts)} conflicts')
+
+    return ids
+
+
+def gem_edges(spec: GEMSpec) -> pd.DataFrame:
+    """
+    Metabolite -> protein production/degradation edges of one model.
+    """
+
+    model = load_gem(spec.path)
+    gene_symbols = pd.read_csv(spec.genes_path, sep=spec.genes_sep, usecols=[spec.genes_column])[spec.genes_column]
+
+    phase('transform')
+
+    reactions = model.reactions
+    reaction_ids = reactions['id'].to_numpy()
+    mets = model.metabolites['id'].to_numpy()
+
+    # matrices stay sparse, only their nonzero entries are read
+    reaction_to_genes = get_gene_symbols(model.rxn_gene, reaction_ids, gene_symbols)
+
+    reaction_to_metabolites_prod = get_metabolites(model.S, mets, reaction_ids, 1, spec.compartments)
+    reaction_to_metabolites_deg = get_metabolites(model.S, mets, reaction_ids, -1, spec.compartments)
+
+    if spec.transport == 'pairs':
+        for df in (reaction_to_metabolites_prod, reaction_to_metabolites_deg):
+            df['transport'] = compartment_pairs(df, 'reaction_id', 'compartment')
+    elif spec.transport != 'subsystem':
+        raise ValueError(f"Unknown transport inference: {spec.transport}")
+
+    metabolite_to_gene = get_metabolite_to_gene(reaction_to_metabolites_prod, reaction_to_metabolites_deg, reaction_to_genes, reactions)
+
+    ss_dict = dict(zip(reaction_ids, reactions['subsystem']))
+    metabolite_to_gene['subsystem'] = metabolite_to_gene['reaction_id'].map(ss_dict)
+    if spec.transport == 'subsystem':
+        metabolite_to_gene['transport'] = subsystem_transport(metabolite_to_gene)
+    metabolite_to_gene['transport_direction'] = transport_direction(
+        metabolite_to_gene['transport'], metabolite_to_gene['subsystem']
+    )
+
+    print(f'collapsed metabolites to genes, now have {len(metabolite_to_gene)} metabolite to gene links')
+
+    ids = get_metabolite_ids(spec, model)
+
+    met_dict = dict(zip(mets, ids['hmdb_id']))
+    metabolite_to_gene['hmdb_id'] = metabolite_to_gene['metabolite_id'].map(met_dict)
+
+    metabolite_to_gene.drop(['metabolite_id', 'reaction_id'], axis=1, inplace=True)
+    metabolite_to_gene.drop_duplicates(inplace=True)
+    metabolite_to_gene.dropna(subset=['hmdb_id'], inplace=True)
+    metabolite_to_gene['status'] = spec.name
+    phase('read')
+    index = get_mapping_index()
+    phase('transform')
+
+    metabolite_to_gene['uniprot'] = index.translate(metabolite_to_gene['gene_id'], 'genesymbol', 'uniprot')
+    print(f'{metabolite_to_gene["uniprot"].isna().sum()} uniprot ids are missing')
+    metabolite_to_gene.dropna(subset=['uniprot'], inplace=True)
+    metabolite_to_gene['uniprot'] = 'uniprot:' + metabolite_to_gene['uniprot']
+
+    metabolite_to_gene.drop_duplicates(subset=['hmdb_id', 'uniprot'], inplace=True)
+
+    metabolite_to_gene['edge_id'] = edge_ids(metabolite_to_gene, ['hmdb_id', 'uniprot'], spec.label)
+
+    return pd.DataFrame({
+        'id': metabolite_to_gene['edge_id'],
+        'source': metabolite_to_gene['hmdb_id'],
+        'target': metabolite_to_gene['uniprot'],
+        'label': spec.label,
+        'status': metabolite_to_gene['status'],
+        'direction': metabolite_to_gene['direction'],
+        'symbol': metabolite_to_gene['gene_id'],
+        'subsystem': metabolite_to_gene['subsystem'],
+        'transport': metabolite_to_gene['transport'],
+        'transport_direction': metabolite_to_gene['transport_direction'],
+        'rev': metabolite_to_gene['rev'],
+    })
+
+
+def _measured_gem_edges(spec: GEMSpec):
+    """
+    `gem_edges` in a pool worker, with the phases and peak RSS of the worker.
+    """
+
+    return measured(f"gem_edges[{spec.name}]", gem_edges, spec, count=len)
+
+
+class GEMAdapter(MetalinksAdapter):
+    """
+    Edges of several models, built concurrently in a process pool.
+
+    The phases and peak RSS of every model are recorded in its worker and
+    attached to the stage in the run report. Inside a worker process, e.g.
+    a stage of `run_stages_parallel`, the models are built one after
+    another instead of in a nested pool.
+
+    Args:
+        models: `GEMSpec`s; their edges are returned in this order
+
+        workers: number of processes, defaults to one per model; 1 builds
+            the models one after another in the calling process
+    """
+
+    cache_attrs = ('models',)
+
+    def __init__(
+        self,
+        models: Sequence[GEMSpec],
+        id_batch_size: int = int(1e6),
+        edge_types: Optional[list] = None,
+        edge_fields: Optional[list] = None,
+        test_mode: bool = False,
+        workers: Optional[int] = None,
+    ):
+        self.models = list(models)
+        self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
+        self.data_source = "GEM"
+        self.data_source_version = ""
+        self.data_license = 'None'
+        self.test_mode = test_mode
+        self.workers = workers
+
+    @property
+    def input_files(self):
+        paths = [path for spec in self.models for path in spec.input_files]
+        return list(dict.fromkeys(paths)) + [MAPPING_INDEX_PATH]
+
+    def get_edges_frame(self):
+        """
+        Get edges from the models, one data frame per model.
+        """
+
+        workers = self.workers or len(self.models)
+        if multiprocessing.parent_process() is not None and workers > 1:
+            logger.info('Building the GEM models serially in this worker process.')
+            workers = 1
+
+        if workers == 1 or len(self.models) == 1:
+            for spec in self.models:
+                yield gem_edges(spec)
+            return
+
+        phase('transform')
+        with ProcessPoolExecutor(min(workers, len(self.models))) as pool:
+            for frame, stats in pool.map(_measured_gem_edges, self.models):
+                add_worker(stats)
+                yield frame
@@ -5,15 +5,33 @@
 BioCypher - HMDB adapter prototype
 """
 
+import os
 from enum import Enum
 from typing import Optional
-import hashlib
-from pypath.inputs import hmdb
 from biocypher._logger import logger
+
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.normalize import normalize_ids
+from metalinks.parsers.hmdb_metabolites import (
+    HMDB_METABOLITES_PATH,
+    NODE_FIELDS,
+    iter_metabolite_tables,
+)
+from metalinks.parsers.hmdb_proteins import read_protein_mapping
 from pandas import read_csv
+import pandas as pd
 
 logger.debug(f"Loading module {__name__}.")
 
+# written by metalinks.parsers.hmdb_proteins from hmdb_proteins.xml; the
+# CSV shipped in the repository is read while no Parquet table exists
+PROTEIN_MAPPING_PATH = 'data/mapping_tables/hmdb_protein_mapping.parquet'
+PROTEIN_MAPPING_CSV_PATH = 'data/mapping_tables/hmdb_protein_mapping.csv'
+REACTIONS_PATH = 'data/HMDB/hmdb_reactions_full_status.csv'
+TRANSPORTDB_PATH = 'data/TransportDB2.0_translated.tsv'
+
 
 class HMDBNodeType(Enum):
     """
@@ -77,7 +95,17 @@ class HMDBMetaboliteToProteinEdgeField(Enum):
 
 
 
-class HMDBAdapter:
+class HMDBAdapter(MetalinksAdapter):
+
+    # local files read by this adapter
+    input_files = [
+        HMDB_METABOLITES_PATH,
+        PROTEIN_MAPPING_PATH,
+        PROTEIN_MAPPING_CSV_PATH,
+        REACTIONS_PATH,
+        TRANSPORTDB_PATH,
+    ]
+
     def __init__(
         self,
         id_batch_size: int = int(1e6),
@@ -86,93 +114,91 @@ class HMDBAdapter:
         edge_types: Optional[list] = None,
         edge_fields: Optional[list] = None,
         test_mode: bool = False,
+        parse_workers: int = 1,
     ):
 
         self.id_batch_size = id_batch_size
+        self.node_types = node_types
+        self.node_fields = node_fields
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.test_mode = test_mode
+        # processes parsing the metabolites .XML, 0 for one per CPU
+        self.parse_workers = parse_workers
 
         self.data_source = "HMDB"
         self.data_version = "v5.0"
         self.data_licence = "None"
 
-    def get_nodes(self):
+    def get_nodes_frame(self):
         """
-        Get nodes from .XML and yield them to the batch writer.
-
-        Args:
-            label: input label of nodes to be read
+        Get nodes from the metabolites .XML, streamed as data frames for the
+        batch writer.
 
         Returns:
-            generator of tuples representing nodes
+            generator of data frames with one row per node
         """
 
         print(  "Getting metabolites"  )
 
-        data = hmdb.metabolites_table(
-            'accession',
-            'kegg_id',
-            'chebi_id',
-            'pubchem_compound_id', 
-            'name',
-            'biological_properties',
-            'diseases',
-            'taxonomy',
-            #  head = 100
-        )
-
-        data = data[data['pubchem_compound_id'] != '']
-        data['cellular_locations'] = data['biological_properties'].apply(lambda x: x['cellular_locations'])
-        data['biospecimen_locations'] = data['biological_properties'].apply(lambda x: x['biospecimen_locations'])
-        data['tissue_locations'] = data['biological_properties'].apply(lambda x: x['tissue_locations'])
-        data['pathways'] = data['biological_properties'].apply(lambda x: [pathway['name'] for pathway in x['pathways']])
-        data['diseases'] = data['diseases'].apply(lambda x: [disease['name'] for disease in x])
-        data['kingdom'] = data['taxonomy'].apply(lambda x: x['kingdom'])
-        data['class'] = data['taxonomy'].apply(lambda x: x['class'])
-        data['sub_class'] = data['taxonomy'].apply(lambda x: x['sub_class'])
-        data['molecular_framework'] = data['taxonomy'].apply(lambda x: x['molecular_framework'])
-        data['name'] = data['name'].apply(lambda x: x.replace('"', "'") if '"' in x else x)
-        
-        for index in range(len(data)):
-            attributes = data.iloc[index, 1:].to_dict()
-            yield data.iloc[index, 0], 'hmdb_metabolite', attributes
+        for data in iter_metabolite_tables(
+            HMDB_METABOLITES_PATH, NODE_FIELDS, workers=self.parse_workers
+        ):
+            phase('transform')
+            data = data[data['pubchem_compound_id'].notna()]
+            data = data.assign(name=data['name'].str.replace('"', "'"))
+            data = data.rename(columns={'accession': 'id'})
+            data.insert(1, 'label', 'hmdb_metabolite')
 
-    def get_edges(self):
-        """
-        Get edges from web and yield them to the batch writer.
+            yield data
+            phase('read')
 
-        Args:
-            label: input label of edges to be read
+    def get_edges_frame(self):
+        """
+        Get edges from web as a data frame for the batch writer.
 
         Returns:
-            generator of tuples representing edges
+            data frame with one row per edge
         """
         
         print(  "Getting mappings"  )
 
-        protein_mapping_path = 'data/mapping_tables/hmdb_protein_mapping.csv'
-        protein_mapping = read_csv(protein_mapping_path, sep=',')
+        mapping_path = PROTEIN_MAPPING_PATH
+        if not os.path.exists(mapping_path):
+            mapping_path = PROTEIN_MAPPING_CSV_PATH
+        protein_mapping = read_protein_mapping(mapping_path, ['hmdbp_id', 'uniprot'])
         id_conversion = dict(zip(protein_mapping['hmdbp_id'], protein_mapping['uniprot']))
 
         print(  "Getting edges"  )
 
-        reactions_path = 'data/HMDB/hmdb_reactions_full_status.csv'
-        reactions = read_csv(reactions_path, sep=',')
+        reactions = read_csv(REACTIONS_PATH, sep=',')
+        tdb = read_csv(TRANSPORTDB_PATH, sep='\t')
+
+        phase('transform')
+        reactions['Metabolite'] = normalize_ids(reactions['Metabolite'], 'hmdb')
         reactions['HMDBP'] = reactions['HMDBP'].apply(lambda x: id_conversion[x] if x in id_conversion else None)
         reactions.rename(columns={'HMDBP': 'uniprot'}, inplace=True)
         reactions.dropna(subset=['uniprot'], inplace=True)
 
-        tdb = read_csv('data/TransportDB2.0_translated.tsv', sep='\t')
         reactions['subsystem'] = 'unknown'
         reactions['subsystem'][reactions['uniprot'].isin(tdb['Entry'])] = 'Transport'
 
 
         reactions['uniprot'] = reactions['uniprot'].apply(lambda x: 'uniprot:' + x if x is not None else None)
-        reactions['reaction_id'] = reactions.apply(lambda x: hashlib.md5(str(x).encode('utf-8')).hexdigest(), axis=1)
+        reactions['reaction_id'] = edge_ids(reactions, ['Metabolite', 'uniprot', 'direction', 'status'], 'PD_hmdb')
         reactions = reactions[['reaction_id'] + [col for col in reactions.columns if col != 'reaction_id']]
 
         # replace values in direction; 'Reactand' -> 'degrading', 'Product' -> 'producing'
         reactions['direction'] = reactions['direction'].replace({'Reactand': 'degrading', 'Product': 'producing'})
         
-        for index in range(len(reactions)):
-            attributes = reactions.iloc[index, 3:].to_dict()
-            yield reactions["reaction_id"][index], reactions['Metabolite'][index], reactions['uniprot'][index], 'PD_hmdb', attributes
+        attributes = reactions.iloc[:, 3:]
+
+        return pd.concat([
+            pd.DataFrame({
+                'id': reactions['reaction_id'],
+                'source': reactions['Metabolite'],
+                'target': reactions['uniprot'],
+                'label': 'PD_hmdb',
+            }),
+            attributes,
+        ], axis=1)
@@ -8,16 +8,21 @@ BioCypher - recon adapter prototype
 from enum import Enum
 from typing import Optional
 import pandas as pd
-import numpy as np
-import hashlib
-from tqdm import tqdm
-import numpy as np
-from pypath.utils import mapping
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH
+from metalinks.mapping.normalize import normalize_ids
+from metalinks.mapping.resolve import MISSING_SYMBOLS_PATH, resolve_uniprot
+
 logger.debug(f"Loading module {__name__}.")
 
+NEURONCHAT_PATH = 'data/NeuronChat/NeuronChatDB_human.csv'
+NEURONCHAT_TABLE_PATH = 'data/mapping_tables/Neuronchat_table.csv'
+
 class NeuronchatEdgeType(Enum):
     """
     RECON edge types.
@@ -40,7 +45,12 @@ class NeuronchatMetaboliteToProteinEdgeField(Enum):
     REFERENCES = 'references'
 
 
-class NeuronchatAdapter:
+class NeuronchatAdapter(MetalinksAdapter):
+
+    input_files = [
+        NEURONCHAT_PATH, NEURONCHAT_TABLE_PATH, MISSING_SYMBOLS_PATH,
+        MAPPING_INDEX_PATH,
+    ]
 
     def __init__(
         self, 
@@ -50,45 +60,43 @@ class NeuronchatAdapter:
         test_mode: bool = False,
     ):
         self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "RECON"
         self.data_source_version = "3D"
         self.data_license = 'None'
         self.test_mode = test_mode
 
-    def get_edges(self):
+    def get_edges_frame(self):
         """
         Get edges from Neuronchat (curated file)
         """
-        neuronchat_path = 'data/NeuronChat/NeuronChatDB_human.csv'
-        neuronchat_table_path = 'data/mapping_tables/Neuronchat_table.csv'
+        ncdb                = pd.read_csv(NEURONCHAT_TABLE_PATH, sep=',')
+
+        ncdb_cut            = pd.read_csv(NEURONCHAT_PATH, sep=',')
 
-        ncdb                = pd.read_csv(neuronchat_table_path, sep=',')
+        phase('transform')
 
-        ncdb_cut            = pd.read_csv(neuronchat_path, sep=',')
         ncdb_cut['Sensor']  = ncdb_cut['interaction_name'].str.split('_').str[1]
 
-        ncdb_dict           = dict(zip(ncdb['Query'], ncdb['HMDB']))
+        ncdb_dict           = dict(zip(ncdb['Query'], normalize_ids(ncdb['HMDB'], 'hmdb')))
         ncdb_cut['Query']   = ncdb_cut['interaction_name'].str.split('_').str[0]
         ncdb_cut['HMDB']    = ncdb_cut['Query'].map(ncdb_dict)
 
         ncdb_cut['gene']    = ncdb_cut['interaction_name'].str.split('_').str[1]
-        ncdb_cut['uniprot'] = ncdb_cut['gene'].apply(lambda x: mapping.map_name(x, 'genesymbol', 'uniprot'))
-
-        missing_symbols = pd.read_csv('data/mapping_tables/missing_symbols.csv')
-        missing_symbols_dict = dict(zip(missing_symbols['symbol'], missing_symbols['uniprot']))
-
-        for row in ncdb_cut.iterrows():
-            if row[1]['uniprot'] == set():
-                try:
-                    row[1]['uniprot'] = [missing_symbols_dict[row[1]['gene']]]
-                except:
-                    print(f"Symbol {row[1]['gene']} not found in mapping tables.")
-                    continue
-            attributes  = {
-                'mode': 'activation', 
-                'references': ''
-            }
-            id = 'uniprot:' + row[1]['uniprot'].pop()
-            r = row[1].astype(str)
-            h = hashlib.md5(''.join(r).encode('utf-8')).hexdigest()
-            yield h, row[1]['HMDB'], id, 'NC', attributes
+        ncdb_cut['uniprot'] = resolve_uniprot(ncdb_cut['gene'])
+
+        for gene in ncdb_cut.loc[ncdb_cut['uniprot'].isna(), 'gene']:
+            print(f"Symbol {gene} not found in mapping tables.")
+        ncdb_cut = ncdb_cut.dropna(subset=['uniprot'])
+
+        ncdb_cut['edge_id'] = edge_ids(ncdb_cut, ['interaction_name', 'HMDB', 'uniprot'], 'NC')
+
+        return pd.DataFrame({
+            'id': ncdb_cut['edge_id'],
+            'source': ncdb_cut['HMDB'],
+            'target': 'uniprot:' + ncdb_cut['uniprot'],
+            'label': 'NC',
+            'mode': 'activation',
+            'references': '',
+        })
@@ -5,19 +5,27 @@
 BioCypher - rhea adapter
 """
 
+import os
 from enum import Enum
 from typing import Optional
 import pandas as pd
-import numpy as np
-import hashlib
-from tqdm import tqdm
-import numpy as np
-import scipy.io as sio
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH, get_mapping_index
+from metalinks.parsers.rhea import parse_reactions
+
 logger.debug(f"Loading module {__name__}.")
 
+# the gzip-compressed release (metalinks.parsers.rhea.RHEA_REACTIONS_URL) is
+# read in place; an uncompressed rhea-reactions.txt is read while it is missing
+RHEA_REACTIONS_PATH = 'data/rhea/rhea-reactions.txt.gz'
+RHEA_REACTIONS_TXT_PATH = 'data/rhea/rhea-reactions.txt'
+RHEA_UNIPROT_PATH = 'data/rhea/rhea2uniprot_human.tsv'
+
 
 class RheaEdgeType(Enum):
     """
@@ -46,7 +54,14 @@ class RheaMetaboliteToProteinEdgeField(Enum):
     REV = 'rev'
 
 
-class RheaAdapter:
+class RheaAdapter(MetalinksAdapter):
+
+    input_files = [
+        RHEA_REACTIONS_PATH,
+        RHEA_REACTIONS_TXT_PATH,
+        RHEA_UNIPROT_PATH,
+        MAPPING_INDEX_PATH,
+    ]
 
     def __init__(
         self, 
@@ -54,44 +69,50 @@ class RheaAdapter:
         edge_types: Optional[list] = None,
         edge_fields: Optional[list] = None,
         test_mode: bool = False,
+        parse_workers: int = 1,
     ):
         self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "RECON"
         self.data_source_version = "3D"
         self.data_license = 'None'
         self.test_mode = test_mode
+        # processes parsing the reactions file, 0 for one per CPU
+        self.parse_workers = parse_workers
 
-    def get_edges(self):
+    def get_edges_frame(self):
         """
         Get edges from RECON.
         """
 
-        rhea_rxn_path = 'data/rhea/rhea-reactions.txt'
-        rhea_protein_path = 'data/rhea/rhea2uniprot_human.tsv'
-        hmdb_mapping_path = 'data/mapping_tables/hmdb_mapping.csv'
+        reactions_path = RHEA_REACTIONS_PATH
+        if not os.path.exists(reactions_path):
+            reactions_path = RHEA_REACTIONS_TXT_PATH
+        reactions = parse_reactions(reactions_path, workers=self.parse_workers)
+        rhea_uniprot = pd.read_csv(RHEA_UNIPROT_PATH, sep=',')
+        index = get_mapping_index()
 
-        entries = parse_text_file(rhea_rxn_path)
-        df = create_dataframe(entries)
+        phase('transform')
 
-        df['RHEA_ID'] = [x.split(':')[1] for x in df['ENTRY']]
-        df['CHEBI_ID'] = df['CHEBI_ID'].str.split(',').str[0]
+        # participants of '<=' equations are written right to left
+        side = reactions['side'].astype(str)
+        flipped = side.map({'left': 'right', 'right': 'left'})
+        df = pd.DataFrame({
+            'RHEA_ID': reactions['reaction'].astype(str),
+            'CHEBI_ID': 'CHEBI:' + reactions['chebi'].astype(str),
+            'POSITION': side.where(reactions['symbol'] != '<=', flipped),
+        })
 
-        rhea_uniprot = pd.read_csv(rhea_protein_path, sep=',')
         rhea_uniprot['RHEA_ID'] = rhea_uniprot['RHEA_ID'].astype(str)
 
         rhea = df.merge(rhea_uniprot, on='RHEA_ID', how='inner')
         rhea.dropna(subset=['ID'], inplace=True)
         rhea.drop_duplicates(subset=['ID', 'CHEBI_ID'], inplace=True)
 
-        hmdb = pd.read_csv(hmdb_mapping_path, sep=',')
-        hmdb.dropna(subset=['chebi_id'], inplace=True)
-        hmdb_dict = dict(zip( hmdb['chebi_id'], hmdb['accession']))
-
-        rhea['HMDB'] = rhea['CHEBI_ID'].map(hmdb_dict)
+        rhea['HMDB'] = index.translate(rhea['CHEBI_ID'], 'chebi', 'hmdb', canonical=False)
         rhea.dropna(subset=['HMDB'], inplace=True)
 
-        df['POSITION'][df['EQUATION_SYMBOL'] == '<='] = ['left' if x == 'right' else 'right' for x in df['POSITION']]
-
         rhea['direction'] = rhea['POSITION'].replace({'right': 'producing', 'left': 'degrading'})
 
         rhea['uniprot'] = 'uniprot:' + rhea['ID']
@@ -99,65 +120,13 @@ class RheaAdapter:
         rhea.drop_duplicates(subset=['HMDB', 'uniprot'], inplace=True)
 
 
-        for row in tqdm(rhea.iterrows()):
-            attributes  = {
-                'status': 'rhea',
-                'direction': row[1]['direction'],
-            }
-            r = row[1].astype(str)
-            h = hashlib.md5(''.join(r).encode('utf-8')).hexdigest()
-            yield h, row[1]['HMDB'], row[1]['uniprot'], 'PD_rhea', attributes
-
-# Function to parse the text file and extract the relevant information
-def parse_text_file(file_path):
-    entries = []
-    with open(file_path, 'r') as file:
-        entry = {}
-        for line in file:
-            line = line.strip()
-            if line.startswith("ENTRY"):
-                if entry:
-                    entries.append(entry)
-                entry = {}
-                entry["ENTRY"] = line.split()[1]
-            elif line.startswith("DEFINITION"):
-                entry["DEFINITION"] = line.split(" ", 1)[1]
-            elif line.startswith("EQUATION"):
-                equation_parts = line.split()[1:]
-                equation_string = ' '.join(equation_parts)
-                equation_symbols = ['<=', '<=>', '=', '=>']
-                equation_symbol = None
-                for symbol in equation_symbols:
-                    if symbol in equation_string:
-                        equation_symbol = symbol
-                        break
-                if equation_symbol:
-                    left, right = equation_string.split(equation_symbol)
-                    left_chebis = [chebi for chebi in left.split(" ") if "CHEBI" in chebi]
-                    right_chebis = [chebi for chebi in right.split(" ") if "CHEBI" in chebi]
-                    entry["LEFT_CHEBI"] = left_chebis
-                    entry["EQUATION_SYMBOL"] = equation_symbol
-                    entry["RIGHT_CHEBI"] = right_chebis
-        if entry:
-            entries.append(entry)
-    return entries
-
-# Function to process entries and create DataFrame
-def create_dataframe(entries):
-    data = []
-    for entry in entries:
-        left_chebis = entry.get("LEFT_CHEBI", [])
-        right_chebis = entry.get("RIGHT_CHEBI", [])
-        equation_symbol = entry.get("EQUATION_SYMBOL", None)
-        entry_value = entry.get("ENTRY", None)
-        
-        # Create separate entries for each left CHEBI ID
-        for left_chebi in left_chebis:
-            data.append((entry_value, left_chebi, equation_symbol, 'left'))
-        
-        # Create separate entries for each right CHEBI ID
-        for right_chebi in right_chebis:
-            data.append((entry_value, right_chebi, equation_symbol, 'right'))
-            
-    df = pd.DataFrame(data, columns=['ENTRY', 'CHEBI_ID', 'EQUATION_SYMBOL', 'POSITION'])
-    return df
\ No newline at end of file
+        rhea['edge_id'] = edge_ids(rhea, ['HMDB', 'uniprot'], 'PD_rhea')
+
+        return pd.DataFrame({
+            'id': rhea['edge_id'],
+            'source': rhea['HMDB'],
+            'target': rhea['uniprot'],
+            'label': 'PD_rhea',
+            'status': 'rhea',
+            'direction': rhea['direction'],
+        })
@@ -8,16 +8,20 @@ BioCypher - recon adapter prototype
 from enum import Enum
 from typing import Optional
 import pandas as pd
-import numpy as np
-import hashlib
-from tqdm import tqdm
-import numpy as np
-from pypath.utils import mapping
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH, get_mapping_index
+from metalinks.mapping.normalize import normalize_ids
+
 logger.debug(f"Loading module {__name__}.")
 
+SCC_INTERACTIONS_PATH = 'data/scConnect/interactions.csv'
+SCC_LIGANDS_PATH = 'data/scConnect/ligands.csv'
+
 class ScconnectEdgeType(Enum):
     """
     scConnect edge types.
@@ -40,7 +44,9 @@ class ScconnectMetaboliteToProteinEdgeField(Enum):
     REFERENCES = 'references'
 
 
-class ScconnectAdapter:
+class ScconnectAdapter(MetalinksAdapter):
+
+    input_files = [SCC_INTERACTIONS_PATH, SCC_LIGANDS_PATH, MAPPING_INDEX_PATH]
 
     def __init__(
         self, 
@@ -50,31 +56,36 @@ class ScconnectAdapter:
         test_mode: bool = False,
     ):
         self.id_batch_size = id_batch_size
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "RECON"
         self.data_source_version = "3D"
         self.data_license = 'None'
         self.test_mode = test_mode
 
-    def get_edges(self):
+    def get_edges_frame(self):
         """
         Get edges from Scconnect (curated file)
         """
-        scc_int_path = 'data/scConnect/interactions.csv'
-        scc_lig_path = 'data/scConnect/ligands.csv'
-        hmdb_path = 'data/mapping_tables/hmdb_mapping.csv'
-
-        scconnect = pd.read_csv(scc_lig_path)  
+        scconnect = pd.read_csv(SCC_LIGANDS_PATH)
         scconnect.dropna(subset=['PubChem CID'], inplace=True)
         scconnect = scconnect[scconnect['Type'].isin(['Metabolite', 'Inorganic'])]
-        interactions = pd.read_csv(scc_int_path)
+        interactions = pd.read_csv(SCC_INTERACTIONS_PATH)
+        index = get_mapping_index()
+
+        phase('transform')
+
         interactions = interactions[interactions['ligand'].isin(scconnect['Name'])]
         interactions = interactions[['ligand', 'target', 'target_uniprot', 'type', 'pubmed_id']]
         interactions = interactions.merge(scconnect[['Name', 'PubChem CID']], left_on='ligand', right_on='Name')
         interactions.drop(columns=['Name'], inplace=True)
+        interactions['PubChem CID'] = normalize_ids(interactions['PubChem CID'], 'pubchem')
         interactions.drop_duplicates(inplace=True)
         interactions.dropna(subset= ['PubChem CID', 'target_uniprot'], inplace=True)
         interactions.rename(columns={'target_uniprot': 'uniprot'}, inplace=True)
         interactions = interactions.assign(uniprot=interactions['uniprot'].str.split('|')).explode('uniprot')
+        interactions['uniprot'] = normalize_ids(interactions['uniprot'], 'uniprot')
+        interactions.dropna(subset=['uniprot'], inplace=True)
 
         interactions['type'] = interactions['type'].replace('Agonist', 'activation')
         interactions['type'] = interactions['type'].replace('Antagonist', 'inhibition')
@@ -86,21 +97,19 @@ class ScconnectAdapter:
         interactions['type'] = interactions['type'].replace('Gating inhibitor', 'inhibition')
 
 
-        hmdb = pd.read_csv(hmdb_path)
-        hmdb.dropna(subset=['pubchem_id'], inplace=True)
-        hmdb_dict = dict(zip( hmdb['pubchem_id'].astype(int), hmdb['accession']))
-        interactions['hmdb'] = interactions['PubChem CID'].astype(int).map(hmdb_dict)
+        interactions['hmdb'] = index.translate(interactions['PubChem CID'], 'pubchem', 'hmdb', canonical=False)
         interactions.dropna(subset=['hmdb'], inplace=True)
         interactions.rename(columns={'pubmed_id': 'references'}, inplace=True)
         interactions['references'].fillna('', inplace=True)
         interactions['references'] = interactions['references'].str.split('|').apply(lambda x: ['PMID:' + i for i in x if i != ''])
 
-        for row in interactions.iterrows():
-            attributes  = {
-                'mode': row[1]['type'],
-                'references': row[1]['references']
-            }
-            id = 'uniprot:' + row[1]['uniprot']
-            r = row[1].astype(str)
-            h = hashlib.md5(''.join(r).encode('utf-8')).hexdigest()
-            yield h, row[1]['hmdb'], id, 'SCC', attributes
+        interactions['edge_id'] = edge_ids(interactions, ['ligand', 'hmdb', 'uniprot', 'type', 'references'], 'SCC')
+
+        return pd.DataFrame({
+            'id': interactions['edge_id'],
+            'source': interactions['hmdb'],
+            'target': 'uniprot:' + interactions['uniprot'],
+            'label': 'SCC',
+            'mode': interactions['type'],
+            'references': interactions['references'],
+        })
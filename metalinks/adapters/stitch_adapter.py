@@ -5,19 +5,71 @@
 BioCypher - stitch adapter prototype
 """
 
+import itertools
 from enum import Enum
 from typing import Optional
-from pypath.utils import mapping
-from pypath.inputs import hmdb
+import numpy as np
+import pandas as pd
 import polars as pl
 
 from biocypher._logger import logger
 
+from metalinks.adapters.base import MetalinksAdapter
+from metalinks.adapters.edge_ids import edge_ids
+from metalinks.build.report import phase
+from metalinks.mapping.index import MAPPING_INDEX_PATH, get_mapping_index
+from metalinks.parsers.stitch import (
+    DETAIL_SCORES,
+    N_BUCKETS,
+    collect_streaming,
+    estimated_size,
+    in_buckets,
+    stitch_actions,
+    stitch_details,
+)
+
 logger.debug(f"Loading module {__name__}.")
 
 DETAILS_PATH = 'data/Stitch/9606.protein_chemical.links.detailed.v5.0.tsv'
 ACTIONS_PATH = 'data/Stitch/9606.actions.v5.0.tsv'
 
+SCORE_CUTOFF = 150
+# estimated bytes of cached STITCH rows held in memory per query, see
+# STITCHAdapter._interactions
+MEMORY_BUDGET = 4 << 30
+
+# edge property of each detail score column, by name (the positional
+# row[2..4] of the original adapter shifted the first three by one)
+SCORE_PROPERTIES = {
+    'experimental': 'experiment',
+    'prediction': 'prediction',
+    'database': 'database',
+    'textmining': 'textmining',
+    'combined_score': 'combined_score',
+}
+
+# default grid of STITCHAdapter.threshold_histogram; 1001 disables a channel
+THRESHOLD_GRID = {
+    'database': [200, 400, 600, 800, 1001],
+    'experiment': [150, 300, 500, 700, 1001],
+    'prediction': [400, 700, 900, 1001],
+    'combined_score': [150, 400, 700, 900],
+}
+
+MODE_ORDER = pl.DataFrame({
+    'mode': [
+        'activation',
+        'inhibition',
+        'binding',
+        'pred_bind',
+        'reaction',
+        'expression',
+        'catalysis',
+    ],
+    'mode_order': list(range(1, 8)),
+})
+
+
 class STITCHEdgeType(Enum):
     """
     STITCH edge types.
@@ -44,9 +96,14 @@ class STITCHMetaboliteToProteinEdgeField(Enum):
     TEXTMINING = "textmining"
     COMBINED_SCORE = "combined_score"
     REFERENCES = "references"
+    MODES = "modes"
+    SIGN = "sign"
+
 
+class STITCHAdapter(MetalinksAdapter):
 
-class STITCHAdapter:
+    input_files = [ACTIONS_PATH, DETAILS_PATH, MAPPING_INDEX_PATH]
+    cache_attrs = ('aggregate',)
 
     def __init__(
         self, 
@@ -54,82 +111,257 @@ class STITCHAdapter:
         edge_types: Optional[list] = None,
         edge_fields: Optional[list] = None,
         test_mode: bool = False,
+        memory_budget: int = MEMORY_BUDGET,
+        aggregate: bool = False,
     ):
         self.id_batch_size = id_batch_size
+        self.memory_budget = memory_budget
+        # one edge per metabolite-protein pair instead of one per mode
+        self.aggregate = aggregate
+        self.edge_types = edge_types
+        self.edge_fields = edge_fields
         self.data_source = "STITCH"
         self.data_source_version = "v5.0"
         self.data_license = 'None'
         self.test_mode = test_mode
 
-    def get_edges(self):
+    def _partitions(self, actions, details) -> int:
+        """
+        Number of CID partitions needed to keep the estimated in-memory size
+        of the cached rows read by one query within the memory budget.
+        """
+
+        size = estimated_size(actions) + estimated_size(details)
+        return min(N_BUCKETS, max(1, -(-size // self.memory_budget)))
+
+    def _query(self, partition, n_partitions, tables, cutoff) -> pl.LazyFrame:
+        """
+        Lazy query of the MR edges of the chemicals in one partition (a
+        range of CID buckets, see `metalinks.parsers.stitch`), all filters
+        applied before the join.
+        """
+
+        actions, details, metabolites, proteins = tables
+
+        def in_partition():
+            return in_buckets(partition, n_partitions) if n_partitions > 1 else pl.lit(True)
+
+        modes = actions.filter(pl.col('mode').is_not_null() & in_partition())
+        details = details.filter(
+            (pl.col('combined_score') > cutoff) & in_partition()
+        )
+
+        return (
+            details.join(modes, on=['cid', 'merged', 'protein'], how='inner')
+            .select(
+                pl.col('cid').cast(pl.Utf8).alias('chemical'),
+                'merged',
+                'protein',
+                *DETAIL_SCORES,
+                'mode',
+            )
+            .join(metabolites, on='chemical', how='inner')
+            .join(proteins, on='protein', how='left')
+        )
+
+    def _interactions(self, cutoff=SCORE_CUTOFF):
         """
-        Get edges from STITCH.
+        Yield the interactions with a combined score above `cutoff`, one
+        data frame per partition.
+
+        The chemicals are split into as many partitions as needed to keep
+        the estimated size of the rows held by one query within
+        `memory_budget`. The cached tables are partitioned by CID bucket
+        when they are written, so every partition query only reads its own
+        row groups; the measured size of each result is logged.
+        """
+
+        index = get_mapping_index()
+        pubchem_hmdb = index.table('pubchem', 'hmdb')
+        metabolites = pl.LazyFrame({
+            'chemical': pubchem_hmdb.index.astype(str).tolist(),
+            'metabolite': pubchem_hmdb.tolist(),
+        })
+        ensp_uniprot = index.table('ensp', 'uniprot')
+        proteins = pl.LazyFrame({
+            'protein': ensp_uniprot.index.astype(str).tolist(),
+            'uniprot': ensp_uniprot.tolist(),
+        })
+
+        actions = stitch_actions(ACTIONS_PATH)
+        details = stitch_details(DETAILS_PATH)
+        tables = actions, details, metabolites, proteins
+
+        n_partitions = self._partitions(actions, details)
+        logger.info(f"Reading STITCH in {n_partitions} partitions.")
+
+        for partition in range(n_partitions):
+            phase('read')
+            query = self._query(partition, n_partitions, tables, cutoff)
+            interactions = collect_streaming(query)
+            size = interactions.estimated_size()
+            logger.info(
+                f"STITCH partition {partition + 1}/{n_partitions}: "
+                f"{interactions.height} interactions, {size >> 20} MB."
+            )
+            if size > self.memory_budget:
+                logger.warning(
+                    f"STITCH partition {partition + 1} exceeds the memory "
+                    f"budget ({size >> 20} MB > {self.memory_budget >> 20} MB)."
+                )
+            phase('transform')
+
+            if self.aggregate:
+                interactions = self._aggregate(interactions)
+
+            yield interactions
+
+    def get_edges_frame(self):
+        """
+        Get edges from STITCH as polars data frames with one column per
+        edge property, for the columnar writer; one frame per partition,
+        see `_interactions`.
+
+        With `aggregate`, the modes of a pair are merged into one edge,
+        see `_aggregate`.
         """
 
         print( 'Getting MR connections from STITCH... ')
 
-        actions = pl.scan_csv(ACTIONS_PATH, separator='\t')
-        flipped = actions.filter(pl.col('item_id_a').str.contains('9606')).select(['item_id_b', 'item_id_a', 'mode'])
-        df1 = flipped.collect()
-        df1 = df1.rename({'item_id_a': 'protein', 'item_id_b': 'chemical', 'mode': 'mode'})
+        # a merged (CIDm) and a stereo (CIDs) row of the same CID are two
+        # edges; aggregation merges them with the other modes of the pair
+        keys = ['chemical', 'protein'] if self.aggregate else ['chemical', 'merged', 'protein', 'mode']
 
-        normal = actions.filter(pl.col('item_id_b').str.contains('9606')).select(['item_id_a', 'item_id_b', 'mode'])
-        df2 = normal.collect()
-        df2 = df2.rename({'item_id_a': 'chemical', 'item_id_b': 'protein', 'mode': 'mode'})
-        df = pl.concat([df1, df2], how='vertical')
+        for interactions in self._interactions(): # change to lower cutoff later
+            reaction_id  = edge_ids(interactions, keys, 'MR', name='reaction_id')
+            interactions = interactions.with_columns(reaction_id)
 
-        details = pl.scan_csv(DETAILS_PATH, separator='\t')
-        data = details.collect()
+            yield interactions.select(
+                pl.col('reaction_id').alias('id'),
+                pl.col('metabolite').alias('source'),
+                pl.concat_str([pl.lit('uniprot:'), pl.col('uniprot')]).alias('target'),
+                pl.lit('MR').alias('label'),
+                pl.col('mode'),
+                *[pl.col(c).alias(p) for c, p in SCORE_PROPERTIES.items()],
+                pl.lit('').alias('references'),
+                *([pl.col('modes'), pl.col('sign')] if self.aggregate else []),
+            )
 
-        interactions = data.join(df, on=['chemical', 'protein'], how='left')
-        del data
-        del df
-        interactions = interactions.filter((pl.col('combined_score') > 150) & (pl.col('mode').is_not_null()) ) # change to lower cutoff later
+    def threshold_histogram(
+        self,
+        grid: Optional[dict] = None,
+        how: str = 'any',
+        out_path: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Number of edges, metabolites and receptors passing each combination
+        of channel score thresholds, computed in one pass over STITCH
+        without any score cutoff.
 
-        interactions = interactions.with_columns(pl.col('protein').str.replace('9606.', ''))
-        interactions = interactions.with_columns(pl.col('chemical').str.slice(4, None).cast(pl.Int64))
+        Args:
+            grid: thresholds per edge property (a score passes if it is
+                greater or equal), defaults to `THRESHOLD_GRID`
 
-        met_table = hmdb.metabolites_table('accession',  'pubchem_compound_id')
+            how: 'any' if an edge passes with one of its scores above the
+                threshold, as in the EdgeTable query, 'all' if it needs all
+                of them; with 'any', a threshold above 1000 disables a
+                channel
 
-        map_dict = dict(zip(met_table.iloc[:,1], met_table.iloc[:,0]))
-        interactions = interactions.with_columns(pl.col('chemical').cast(pl.Utf8).map_dict(map_dict).alias('metabolite'))
-        interactions = interactions.filter(pl.col('metabolite').is_not_null())
+            out_path: optional CSV to save the table to
+
+        Returns:
+            data frame with one column per channel and the columns edges,
+            metabolites and receptors, one row per threshold combination
+        """
 
-        order = {
-            'activation': 1,
-            'inhibition': 2,
-            'binding': 3,
-            'pred_bind': 4,
-            'reaction': 5,
-            'expression': 6,
-            'catalysis': 7
-        }
+        grid = {p: sorted(t) for p, t in (grid or THRESHOLD_GRID).items()}
+        channels = list(grid)
+        source_columns = {p: c for c, p in SCORE_PROPERTIES.items()}
+        shape = tuple(len(grid[p]) + 1 for p in channels)
 
-        interactions = interactions.with_columns(pl.col("mode").map_dict(order).alias("mode_order"))
-        interactions = interactions.sort("mode_order").drop("mode_order")       
+        hist = np.zeros(shape, dtype=np.int64)
+        met_bins = []
+        rec_bins = []
 
-        reaction_id  = interactions.hash_rows(seed=42) # change to md5 later
-        interactions = interactions.with_columns(reaction_id)
-        interactions = interactions.rename({'': 'reaction_id'})
+        for interactions in self._interactions(cutoff=-1):
+            # number of thresholds passed in each channel
+            bins = [
+                np.searchsorted(
+                    grid[p],
+                    interactions[source_columns[p]].fill_null(-1).to_numpy(),
+                    side='right',
+                )
+                for p in channels
+            ]
+            flat = np.ravel_multi_index(bins, shape)
+            hist += np.bincount(flat, minlength=hist.size).reshape(shape)
+            # distinct (node, bins) pairs for the node counts
+            met_bins.append(
+                pd.DataFrame({'node': interactions['metabolite'].to_list(), 'bin': flat})
+                .drop_duplicates()
+            )
+            rec_bins.append(
+                pd.DataFrame({'node': interactions['uniprot'].to_list(), 'bin': flat})
+                .dropna()
+                .drop_duplicates()
+            )
 
-        uniprot_df = mapping.translation_df('ensp_biomart', 'uniprot')
-        uniprot_df.rename(columns={'ensp_biomart': 'protein'}, inplace=True)
+        # edges passing all thresholds: suffix sums, below all: prefix sums
+        above = hist
+        below = hist
+        for axis in range(hist.ndim):
+            above = np.flip(np.flip(above, axis).cumsum(axis), axis)
+            below = below.cumsum(axis)
 
-        uniprot_dict = dict(zip(uniprot_df['protein'], uniprot_df['uniprot']))
+        nodes = []
+        for frames in (met_bins, rec_bins):
+            df = pd.concat(frames, ignore_index=True).drop_duplicates()
+            codes = pd.factorize(df['node'])[0]
+            node_bins = np.array(np.unravel_index(df['bin'].to_numpy(dtype=np.int64), shape))
+            nodes.append((codes, node_bins.reshape(len(shape), -1)))
 
-        interactions = interactions.with_columns(pl.col('protein').cast(pl.Utf8).map_dict(uniprot_dict).alias('uniprot'))
-        interactions = interactions.with_columns(pl.col('uniprot').cast(pl.Utf8).apply(lambda x: 'uniprot:' + x).alias('uniprot'))
+        rows = []
+        for ks in itertools.product(*(range(len(grid[p])) for p in channels)):
+            if how == 'all':
+                edges = above[tuple(k + 1 for k in ks)]
+            else:
+                edges = hist.sum() - below[ks]
 
-        for row in interactions.iter_rows():
+            row = dict(zip(channels, (grid[p][k] for p, k in zip(channels, ks))))
+            row['edges'] = int(edges)
+            for name, (codes, node_bins) in zip(('metabolites', 'receptors'), nodes):
+                passed = node_bins > np.array(ks)[:, None]
+                mask = passed.all(axis=0) if how == 'all' else passed.any(axis=0)
+                row[name] = len(np.unique(codes[mask]))
+            rows.append(row)
+
+        table = pd.DataFrame(rows)
+        if out_path:
+            table.to_csv(out_path, index=False)
+        return table
+
+    def _aggregate(self, interactions: pl.DataFrame) -> pl.DataFrame:
+        """
+        One row per metabolite-protein pair, whether the CID was merged or
+        stereo-specific: all modes in `MODE_ORDER`
+        (`modes`), the first of them (`mode`), the maximum of each score
+        and the sign of the interaction: 1 for activation, -1 for
+        inhibition, 0 for both or neither.
+        """
 
-            attributes = {
-                'mode': row[7],
-                'database': row[2],
-                'experiment': row[3],
-                'prediction': row[4],
-                'textmining': row[5],
-                'combined_score': row[6],
-                'references': ''
-            }
+        mode = pl.col('mode')
 
-            yield str(row[9]), row[8], row[10], 'MR', attributes # only temporary fix 
+        return (
+            interactions.join(MODE_ORDER, on='mode', how='left')
+            .sort('mode_order', nulls_last=True)
+            .group_by(['chemical', 'protein', 'metabolite', 'uniprot'], maintain_order=True)
+            .agg(
+                mode.unique(maintain_order=True).alias('modes'),
+                mode.first(),
+                *[pl.col(c).max() for c in DETAIL_SCORES],
+                (
+                    (mode == 'activation').any().cast(pl.Int8)
+                    - (mode == 'inhibition').any().cast(pl.Int8)
+                ).alias('sign'),
+            )
+        )
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compartment and transport inference for the metabolite-to-gene tables of
+the GEM adapters (Recon, HMR).
+
+All functions work on whole columns: the compartments of a reaction are
+found with one group-by over (reaction, compartment), transports by a join
+against a rule table, instead of one mask over the whole table per
+reaction or per rule.
+"""
+
+import numpy as np
+import pandas as pd
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+UNKNOWN = "unknown"
+
+# compartment reached from the cytosol by the transport subsystems of Recon
+TRANSPORT_SUBSYSTEMS = {
+    "Transport, extracellular": "e",
+    "Transport, mitochondrial": "m",
+    "Transport, endoplasmic reticular": "r",
+    "Transport, lysosomal": "l",
+    "Transport, peroxisomal": "x",
+    "Transport, golgi apparatus": "g",
+    "Transport, nuclear": "n",
+}
+
+
+def subsystem_rules(subsystems: dict = TRANSPORT_SUBSYSTEMS) -> pd.DataFrame:
+    """
+    Rule table (subsystem, compartment, transport): in the transport
+    subsystem of compartment X, a metabolite in X moves X->c, one in the
+    cytosol c->X.
+    """
+
+    rows = []
+    for subsystem, comp in subsystems.items():
+        rows.append((subsystem, comp, f"{comp}->c"))
+        rows.append((subsystem, "c", f"c->{comp}"))
+    return pd.DataFrame(rows, columns=["subsystem", "compartment", "transport"])
+
+
+def compartment(metabolite_ids: pd.Series, syntax: str = "brackets") -> pd.Series:
+    """
+    Compartment of metabolite ids: 'brackets' for Recon ids (`glc_D[e]`),
+    'suffix' for the last character of HMR ids (`MAM01965e`).
+    """
+
+    if syntax == "brackets":
+        return metabolite_ids.str.extract(r"\[([^\]]*)", expand=False)
+    if syntax == "suffix":
+        return metabolite_ids.str[-1]
+    raise ValueError(f"Unknown compartment syntax: {syntax}")
+
+
+def subsystem_transport(
+    df: pd.DataFrame,
+    rules: pd.DataFrame = None,
+    subsystem: str = "subsystem",
+    compartment: str = "compartment",
+) -> pd.Series:
+    """
+    Transport of each row looked up in a (subsystem, compartment) rule
+    table, 'unknown' where no rule applies.
+    """
+
+    rules = subsystem_rules() if rules is None else rules
+    keys = df[[subsystem, compartment]].set_axis(["subsystem", "compartment"], axis=1)
+    transport = keys.merge(rules, on=["subsystem", "compartment"], how="left")["transport"]
+    return pd.Series(transport.fillna(UNKNOWN).to_numpy(), index=df.index, name="transport")
+
+
+def compartment_pairs(
+    df: pd.DataFrame,
+    reaction: str = "reaction_id",
+    compartment: str = "comp_out",
+) -> pd.Series:
+    """
+    Transport of each row from the compartments of its reaction: for
+    reactions spanning exactly two compartments a and b (in order of
+    appearance), 'a->b' for the rows in a and 'b->a' for those in b;
+    'unknown' for all other reactions.
+    """
+
+    pairs = df[[reaction, compartment]].drop_duplicates()
+    groups = pairs.groupby(reaction, sort=False)[compartment]
+    pairs = pairs.assign(
+        n=groups.transform("size"),
+        first=groups.transform("first"),
+        last=groups.transform("last"),
+    )
+    pairs = pairs[pairs["n"] == 2]
+    other = pairs["last"].where(pairs[compartment] == pairs["first"], pairs["first"])
+    pairs = pairs.assign(transport=pairs[compartment] + "->" + other)
+
+    transport = df[[reaction, compartment]].merge(
+        pairs[[reaction, compartment, "transport"]],
+        on=[reaction, compartment],
+        how="left",
+    )["transport"]
+    return pd.Series(transport.fillna(UNKNOWN).to_numpy(), index=df.index, name="transport")
+
+
+def transport_direction(transport: pd.Series, subsystem: pd.Series) -> pd.Series:
+    """
+    'in' for transports starting in the cytosol and for e->c, 'out' for
+    c->e and the other rows of transport subsystems, 'unknown' otherwise.
+    """
+
+    direction = np.full(len(transport), UNKNOWN, dtype=object)
+    direction[subsystem.str.contains("Transport", na=False).to_numpy(bool)] = "out"
+    direction[transport.str.startswith("c", na=False).to_numpy(bool)] = "in"
+    direction[(transport == "c->e").to_numpy(bool)] = "out"
+    direction[(transport == "e->c").to_numpy(bool)] = "in"
+    return pd.Series(direction, index=transport.index, name="transport_direction")
@@ -9,14 +9,19 @@ import re
 
 from tqdm import tqdm  # progress bar
 from pypath.share import curl, settings
-from pypath.utils import mapping
 from pypath.inputs import uniprot
 from biocypher._logger import logger
+
+from metalinks.build.report import phase
+from metalinks.mapping.index import get_mapping_index
+from metalinks.mapping.resolve import resolve_genesymbols
 from contextlib import ExitStack
 from bioregistry import normalize_curie
 
 logger.debug(f"Loading module {__name__}.")
 
+GTP_TARGETS_PATH = "data/targets_and_families.csv"
+
 
 class UniprotNodeType(Enum):
     """
@@ -245,22 +250,15 @@ class Uniprot:
             # ENST and ENSG ids
             if arg == UniprotNodeField.PROTEIN_ENSEMBL_TRANSCRIPT_IDS.value:
 
-                for protein, attribute_value in self.data.get(arg).items():
-
-                    attribute_value, ensg_ids = self._find_ensg_from_enst(
-                        attribute_value
-                    )
-
-                    # update enst in data dict
-                    self.data[UniprotNodeField.PROTEIN_ENSEMBL_TRANSCRIPT_IDS.value][
-                        protein
-                    ] = attribute_value
+                enst_ids, ensg_ids = self._find_ensg_from_enst(
+                    self.data.get(arg)
+                )
 
-                    if ensg_ids:
-                        # add ensgs to data dict
-                        self.data[UniprotNodeField.PROTEIN_ENSEMBL_GENE_IDS.value][
-                            protein
-                        ] = ensg_ids
+                # update enst and add ensgs in data dict
+                self.data[arg].update(enst_ids)
+                self.data[UniprotNodeField.PROTEIN_ENSEMBL_GENE_IDS.value].update(
+                    ensg_ids
+                )
 
             # Protein names
             elif arg == UniprotNodeField.PROTEIN_NAMES.value:
@@ -306,18 +304,24 @@ class Uniprot:
             f"{[type.name for type in self.node_types]}."
         )
 
-        GtP = pd.read_csv("data/targets_and_families.csv", sep=",", skiprows=1)
+        GtP = pd.read_csv(GTP_TARGETS_PATH, sep=",", skiprows=1)
         target_dict = dict(zip(GtP["Human SwissProt"], GtP["Type"]))
 
+        phase("transform")
+
+        symbols = resolve_genesymbols(self.uniprot_ids)
+        symbol_dict = dict(zip(self.uniprot_ids, symbols))
+
         for uniprot_entity in self._reformat_and_filter_proteins():
 
             protein_id, all_props = uniprot_entity
 
             protein_props = self._get_protein_properties(all_props)
 
-            symbol = mapping.map_name(protein_id.split(":")[1], "uniprot", "genesymbol")
+            accession = protein_id.split(":")[1]
+            symbol = symbol_dict.get(accession)
 
-            receptor_type = target_dict.get(protein_id.split(":")[1])
+            receptor_type = target_dict.get(accession)
 
             if receptor_type:
                 protein_props[UniprotNodeField.PROTEIN_RECEPTOR_TYPE.value] = (
@@ -325,8 +329,8 @@ class Uniprot:
                 )
             else:
                 protein_props[UniprotNodeField.PROTEIN_RECEPTOR_TYPE.value] = "NA"
-            if symbol:
-                protein_props[UniprotNodeField.PROTEIN_SYMBOL.value] = symbol.pop()
+            if isinstance(symbol, str):
+                protein_props[UniprotNodeField.PROTEIN_SYMBOL.value] = symbol
             else:
                 protein_props[UniprotNodeField.PROTEIN_SYMBOL.value] = "NA"
 
@@ -659,37 +663,48 @@ class Uniprot:
         else:
             return None
 
-    def _find_ensg_from_enst(self, enst_list):
+    def _find_ensg_from_enst(self, enst_data):
         """
-        take ensembl transcript ids, return ensembl gene ids by using pypath mapping tool
+        take ensembl transcript ids of all proteins, return ensembl gene ids
+        by translating all transcripts at once with the mapping index
 
         Args:
-            field_value: ensembl transcript list
+            enst_data: dictionary of protein ids to ensembl transcript lists
 
+        Returns:
+            dictionary of protein ids to cleaned transcript ids and dictionary
+            of protein ids to gene ids, for proteins with at least one gene id
         """
 
-        enst_list = self._ensure_iterable(enst_list)
-
-        enst_list = [enst.split(" [")[0] for enst in enst_list]
-
-        ensg_ids = set()
-        for enst_id in enst_list:
-            ensg_id = list(
-                mapping.map_name(enst_id.split(".")[0], "enst_biomart", "ensg_biomart")
-            )
-            ensg_id = ensg_id[0] if ensg_id else None
-            if ensg_id:
-                ensg_ids.add(ensg_id)
-
-        ensg_ids = list(ensg_ids)
+        enst_dict = {}
+        for protein, enst_list in enst_data.items():
+            enst_list = self._ensure_iterable(enst_list) or []
+            enst_dict[protein] = [enst.split(" [")[0] for enst in enst_list]
+
+        # one row per (protein, transcript)
+        transcripts = pd.Series(enst_dict, dtype="object").explode().dropna()
+        genes = pd.DataFrame({
+            "protein": transcripts.index,
+            "ensg": get_mapping_index()
+            .translate(transcripts, "enst", "ensg")
+            .values,
+        })
+        genes = (
+            genes.dropna()
+            .drop_duplicates()
+            .groupby("protein", sort=False)["ensg"]
+            .agg(list)
+        )
 
-        if len(ensg_ids) == 1:
-            ensg_ids = ensg_ids[0]
+        ensg_dict = {}
+        for protein, ensg_ids in genes.items():
+            ensg_dict[protein] = ensg_ids[0] if len(ensg_ids) == 1 else ensg_ids
 
-        if len(enst_list) == 1:
-            enst_list = enst_list[0]
+        for protein, enst_list in enst_dict.items():
+            if len(enst_list) == 1:
+                enst_dict[protein] = enst_list[0]
 
-        return enst_list, ensg_ids
+        return enst_dict, ensg_dict
 
     @lru_cache
     def _normalise_curie_cached(
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Content-addressed build cache for adapter output.
+
+The output of a stage is stored as an intermediate file (see
+`metalinks.build.intermediate`) named after a key that hashes
+
+- the contents of the local input files of the adapter (`input_files`),
+- the configuration of the stage (method, node/edge types and fields,
+  test mode and the attributes listed in the adapter's `cache_attrs`),
+- the source code of the `metalinks` package, since adapters share most of
+  their logic through its modules (edge ids, mapping, parsers, the GEM
+  engine), and the pypath version, which provides the remote inputs of
+  several adapters.
+
+Adapters without an `input_files` attribute (e.g. UniProt, which only reads
+from the web) are never cached.
+"""
+
+import hashlib
+import json
+import os
+from enum import Enum
+from importlib import metadata
+from typing import Optional
+
+from biocypher._logger import logger
+
+from metalinks.build.intermediate import read_intermediate, tee_intermediate
+
+logger.debug(f"Loading module {__name__}.")
+
+CACHE_FORMAT_VERSION = 1
+_DIGEST_CHUNK = 1 << 24
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _pypath_version():
+    try:
+        return metadata.version("pypath-omnipath")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _config_value(value):
+    """
+    JSON-serialisable representation of a stage configuration value.
+    """
+
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}={value.value}"
+    if isinstance(value, (list, tuple)):
+        return [_config_value(v) for v in value]
+    return value
+
+
+class BuildCache:
+    """
+    Directory of cached stage outputs keyed by their inputs.
+
+    Args:
+        cache_dir: directory holding the cached intermediates
+
+        refresh: if True, ignore existing entries and recompute every stage
+    """
+
+    def __init__(self, cache_dir: str = ".build_cache", refresh: bool = False):
+        self.cache_dir = cache_dir
+        self.refresh = refresh
+        self._digest_index_path = os.path.join(cache_dir, "file_digests.json")
+        self._digest_index = None
+        self._code_digest = None
+
+    def is_cacheable(self, stage) -> bool:
+        return getattr(stage.adapter, "input_files", None) is not None
+
+    def key(self, stage) -> str:
+        """
+        Compute the cache key of a stage.
+        """
+
+        adapter = stage.adapter
+
+        config = {
+            "format": CACHE_FORMAT_VERSION,
+            "stage": stage.name,
+            "kind": stage.kind,
+            "test_mode": getattr(adapter, "test_mode", None),
+        }
+        attrs = ("node_types", "node_fields", "edge_types", "edge_fields")
+        # further options changing the output, declared by the adapter
+        attrs += tuple(getattr(adapter, "cache_attrs", ()))
+        for attr in attrs:
+            config[attr] = _config_value(getattr(adapter, attr, None))
+
+        code = {
+            "package": self.code_digest(),
+            "pypath": _pypath_version(),
+        }
+
+        inputs = {
+            path: self.file_digest(path) for path in sorted(adapter.input_files)
+        }
+
+        blob = json.dumps([config, code, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def code_digest(self) -> str:
+        """
+        SHA-256 over the sources of all modules of the `metalinks` package,
+        computed once per cache instance.
+        """
+
+        if self._code_digest is None:
+            sources = []
+            for root, dirs, files in os.walk(PACKAGE_DIR):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                sources.extend(
+                    os.path.join(root, name) for name in sorted(files)
+                    if name.endswith(".py")
+                )
+            h = hashlib.sha256()
+            for path in sources:
+                h.update(os.path.relpath(path, PACKAGE_DIR).encode("utf-8"))
+                with open(path, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            self._code_digest = h.hexdigest()
+        return self._code_digest
+
+    def path(self, stage, key: Optional[str] = None) -> str:
+        key = key or self.key(stage)
+        return os.path.join(self.cache_dir, stage.name, f"{key}.pkl")
+
+    def lookup(self, stage) -> Optional[str]:
+        """
+        Return the path of the cached output of a stage, if there is one.
+        """
+
+        if self.refresh or not self.is_cacheable(stage):
+            return None
+
+        path = self.path(stage)
+        if os.path.exists(path):
+            logger.info(f"Build cache hit for {stage.name}.")
+            return path
+
+        logger.info(f"Build cache miss for {stage.name}.")
+        return None
+
+    def replay(self, path: str):
+        return read_intermediate(path)
+
+    def record(self, stage, items):
+        """
+        Pass the output of a stage through while storing it in the cache.
+        Older entries of the same stage are dropped once the new one is
+        complete.
+        """
+
+        if not self.is_cacheable(stage):
+            yield from items
+            return
+
+        path = self.path(stage)
+        yield from tee_intermediate(items, path)
+        self.prune(stage, keep=path)
+
+    def prune(self, stage, keep: str):
+        stage_dir = os.path.dirname(keep)
+        for name in os.listdir(stage_dir):
+            path = os.path.join(stage_dir, name)
+            if path != keep and name.endswith(".pkl"):
+                os.remove(path)
+
+    def file_digest(self, path: str) -> str:
+        """
+        SHA-256 of a file's contents.
+
+        Digests are memoised on disk by path, size and modification time, so
+        large unchanged inputs (STITCH, GEM models) are only hashed once.
+        """
+
+        if not os.path.exists(path):
+            return "missing"
+
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+
+        index = self._load_digest_index()
+        entry = index.get(path)
+        if entry and entry["stamp"] == stamp:
+            return entry["sha256"]
+
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_DIGEST_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+
+        index[path] = {"stamp": stamp, "sha256": digest}
+        self._save_digest_index()
+        return digest
+
+    def _load_digest_index(self):
+        if self._digest_index is None:
+            try:
+                with open(self._digest_index_path) as f:
+                    self._digest_index = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._digest_index = {}
+        return self._digest_index
+
+    def _save_digest_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._digest_index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._digest_index, f)
+        os.replace(tmp_path, self._digest_index_path)
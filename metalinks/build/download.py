@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming, concurrent and resumable file downloads.
+
+Files are streamed in chunks to `<path>.part`. An interrupted download is
+resumed from the size of the partial file with an HTTP Range request, and
+the partial file is only renamed to its final path after its size (and,
+if given, its checksum) has been verified. A file existing under its final
+path is therefore always complete.
+
+`download_files` stops the build on a failed download unless the file is
+marked optional.
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import requests
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+CHUNK_SIZE = 1 << 20
+
+
+class DownloadError(Exception):
+    pass
+
+
+def _range_total(response):
+    """
+    Total size of the remote file from the Content-Range header, as sent
+    with 206 and 416 responses.
+    """
+
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    return None
+
+
+def _content_length(response, offset):
+    """
+    Total size of the remote file according to the response headers.
+    """
+
+    total = _range_total(response)
+    if total is not None:
+        return total
+
+    length = response.headers.get("Content-Length")
+    if length is not None and length.isdigit():
+        return int(length) + offset
+
+    return None
+
+
+def _remote_size(session, url, timeout):
+    """
+    Size of the remote file from a HEAD request, None if not reported.
+    """
+
+    try:
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+    except (requests.ConnectionError, requests.Timeout):
+        return None
+    if response.status_code != 200:
+        return None
+    return _content_length(response, 0)
+
+
+def _file_checksum(path, algorithm):
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _verify_checksum(path, checksum):
+    """
+    Compare a file against a checksum of the form "<algorithm>:<hexdigest>",
+    e.g. "md5:0123...", as listed by Zenodo.
+    """
+
+    algorithm, expected = checksum.split(":", 1)
+    actual = _file_checksum(path, algorithm)
+    if actual != expected.lower():
+        raise DownloadError(
+            f"{algorithm} mismatch for {path}: expected {expected}, got {actual}"
+        )
+
+
+def download_file(
+    url: str,
+    path: str,
+    checksum: Optional[str] = None,
+    retries: int = 5,
+    timeout: float = 60,
+    session: Optional[requests.Session] = None,
+) -> str:
+    """
+    Download one file, resuming from a previous partial download.
+
+    Args:
+        url: remote location
+
+        path: final local path
+
+        checksum: optional "<algorithm>:<hexdigest>" the file must match
+
+        retries: number of attempts; each retry resumes where the previous
+            one stopped
+
+        timeout: connect and read timeout in seconds
+
+        session: optional `requests.Session` to reuse connections
+
+    Returns:
+        the local path
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if os.path.exists(path):
+        logger.info(f"File already exists: {path}")
+        return path
+
+    session = session or requests.Session()
+    part_path = path + ".part"
+
+    for attempt in range(1, retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        try:
+            with session.get(
+                url,
+                headers=headers,
+                stream=True,
+                allow_redirects=True,
+                timeout=timeout,
+            ) as response:
+                if response.status_code == 416:
+                    # range not satisfiable: the partial file may already be
+                    # complete; its size is checked against the remote size
+                    # below and the download restarts if they differ
+                    total = _range_total(response)
+                    if total is None:
+                        total = _remote_size(session, url, timeout)
+                    if total is None:
+                        os.remove(part_path)
+                        continue
+                elif response.status_code == 206:
+                    total = _content_length(response, offset)
+                elif response.status_code == 200:
+                    # server ignored the range, start over
+                    offset = 0
+                    total = _content_length(response, 0)
+                else:
+                    raise DownloadError(
+                        f"Failed to download {url}: HTTP {response.status_code}"
+                    )
+
+                if response.status_code != 416:
+                    mode = "ab" if offset else "wb"
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            logger.warning(
+                f"Download of {url} interrupted (attempt {attempt}/{retries}): {e}"
+            )
+            time.sleep(min(2 ** (attempt - 1), 30))
+            continue
+
+        size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if total is not None and size != total:
+            logger.warning(
+                f"Incomplete download of {url}: {size} of {total} bytes "
+                f"(attempt {attempt}/{retries})."
+            )
+            if size > total or response.status_code == 416:
+                os.remove(part_path)
+            continue
+
+        if checksum:
+            try:
+                _verify_checksum(part_path, checksum)
+            except DownloadError:
+                os.remove(part_path)
+                raise
+
+        os.replace(part_path, path)
+        logger.info(f"Downloaded and saved: {path}")
+        return path
+
+    raise DownloadError(f"Failed to download {url} after {retries} attempts.")
+
+
+def download_files(
+    file_mappings: dict,
+    checksums: Optional[dict] = None,
+    max_workers: int = 4,
+    optional: Iterable[str] = (),
+    **kwargs,
+) -> list:
+    """
+    Download several files concurrently.
+
+    A failed download raises a `DownloadError` once all downloads have
+    finished, which stops the build, unless its path is listed in
+    `optional`: those failures are logged and the build goes on without
+    the file, e.g. for sources an adapter can read from an older local
+    copy.
+
+    Args:
+        file_mappings: dictionary of URLs to local file paths
+
+        checksums: optional dictionary of local file paths to
+            "<algorithm>:<hexdigest>" checksums
+
+        max_workers: number of parallel downloads
+
+        optional: local paths whose download may fail
+
+        kwargs: passed to `download_file`
+
+    Returns:
+        list of local paths, in the order of `file_mappings`; None for
+        optional files that could not be downloaded
+    """
+
+    checksums = checksums or {}
+    optional = set(optional)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(download_file, url, path, checksums.get(path), **kwargs)
+            for url, path in file_mappings.items()
+        ]
+
+        paths, failed = [], []
+        for (url, path), future in zip(file_mappings.items(), futures):
+            try:
+                paths.append(future.result())
+            except (DownloadError, requests.RequestException) as e:
+                logger.error(f"Download of {url} failed: {e}")
+                if path not in optional:
+                    failed.append(e)
+                paths.append(None)
+
+    if failed:
+        raise failed[0]
+    return paths
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+On-disk intermediates for adapter output.
+
+An intermediate is a plain file holding the tuples an adapter generator
+yields (nodes or edges), pickled in batches so that it can be written by a
+worker process and replayed into the BioCypher writer by the parent.
+"""
+
+import os
+import pickle
+from typing import Iterable, Iterator
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+DEFAULT_BATCH_SIZE = 100_000
+
+
+def write_intermediate(
+    items: Iterable,
+    path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """
+    Consume an adapter generator and pickle its items to disk in batches.
+
+    The file is first written under a temporary name and renamed once
+    complete, so a crashed worker never leaves a readable partial file.
+
+    Args:
+        items: generator of node or edge tuples
+
+        path: destination file
+
+        batch_size: number of tuples pickled together
+
+    Returns:
+        number of items written
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+
+    n = 0
+    batch = []
+    with open(tmp_path, "wb") as f:
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                n += len(batch)
+                batch = []
+        if batch:
+            pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+            n += len(batch)
+
+    os.replace(tmp_path, path)
+    return n
+
+
+def read_intermediate(path: str) -> Iterator:
+    """
+    Replay the items of an intermediate file in their original order.
+
+    Args:
+        path: file written by `write_intermediate`
+
+    Returns:
+        generator of node or edge tuples
+    """
+
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def tee_intermediate(
+    items: Iterable,
+    path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator:
+    """
+    Pass items through while recording them to an intermediate file.
+
+    The file only appears under `path` once the generator has been consumed
+    completely; an aborted run leaves no intermediate behind.
+
+    Args:
+        items: generator of node or edge tuples
+
+        path: destination file
+
+        batch_size: number of tuples pickled together
+
+    Returns:
+        generator yielding the same items as `items`
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+
+    batch = []
+    try:
+        with open(tmp_path, "wb") as f:
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    batch = []
+                yield item
+            if batch:
+                pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
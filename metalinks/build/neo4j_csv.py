@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Columnar output path: write an adapter's final data frame straight into
+the neo4j-admin import files of the BioCypher batch writer.
+
+A columnar stage returns a pandas or polars data frame (or an iterable of
+them) instead of a generator of tuples. Node frames have the columns `id`
+and `label`, edge frames `id`, `source`, `target` and `label`; all other
+columns are properties, named as in the schema config.
+
+A `FrameWriter` is bound to one BioCypher instance and the CSV settings of
+its writer (`CsvSettings`, read from the same config file and output
+directory BioCypher is given). For every label, the first row is written
+by BioCypher itself. This creates the header file and the entry in the
+import call, and gives a reference line: the remaining rows are formatted
+column by column following the header (same delimiters and quoting), and
+only if the formatted first row is identical to the reference line they
+are written to additional part files next to BioCypher's. Otherwise the
+rows are passed to BioCypher as tuples as before (`iter_nodes`,
+`iter_edges`), as are frames of a label whose columns differ from the
+frame its layout was derived from.
+
+Quoted values have their quote characters doubled and line breaks replaced
+by spaces, so that a value can not end its field or line early.
+
+Rows repeating an id of an earlier row of the same frame are dropped
+before writing; BioCypher's own duplicate tracking only sees the reference
+rows and the rows of generator stages. Ids are not tracked across frames:
+edge ids are namespaced by their source and unique per source by their key
+columns (`metalinks.adapters.edge_ids`), so the frames of one stage, e.g.
+the partitions of STITCH, do not share ids.
+"""
+
+import codecs
+import glob
+import os
+from typing import Iterator, NamedTuple, Optional
+
+import yaml
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+DEFAULT_BATCH_SIZE = int(1e6)
+
+FRAME_COLUMNS = {
+    "nodes": ("id", "label"),
+    "edges": ("id", "source", "target", "label"),
+}
+
+# header suffixes of properties written without quotes
+_SCALAR_TYPES = (":long", ":int", ":double", ":float", ":boolean")
+
+
+def is_frame(obj) -> bool:
+    return isinstance(obj, (pd.DataFrame, pl.DataFrame))
+
+
+def _slice(frame, start: int, length: int):
+    if isinstance(frame, pl.DataFrame):
+        return frame.slice(start, length)
+    return frame.iloc[start:start + length]
+
+
+def iter_batches(frames, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Consecutive slices of at most `batch_size` rows of a frame, or of each
+    frame of an iterable of frames.
+    """
+
+    for frame in [frames] if is_frame(frames) else frames:
+        for start in range(0, len(frame), batch_size):
+            yield _slice(frame, start, batch_size)
+
+
+def iter_records(kind: str, frame, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Node or edge tuples of a frame, as yielded by the generator adapters.
+    """
+
+    keys = FRAME_COLUMNS[kind]
+    props = [c for c in frame.columns if c not in keys]
+
+    for batch in iter_batches(frame, batch_size):
+        key_values = [batch[c].to_list() for c in keys]
+        prop_values = [batch[c].to_list() for c in props]
+        for i, key in enumerate(zip(*key_values)):
+            yield key + (dict(zip(props, (v[i] for v in prop_values))),)
+
+
+def iter_nodes(frame) -> Iterator[tuple]:
+    return iter_records("nodes", frame)
+
+
+def iter_edges(frame) -> Iterator[tuple]:
+    return iter_records("edges", frame)
+
+
+# biocypher defaults of the neo4j writer settings
+_DEFAULT_SETTINGS = {
+    "delimiter": ";",
+    "array_delimiter": "|",
+    "quote_character": "'",
+}
+
+
+class CsvSettings(NamedTuple):
+    """
+    Output directory, delimiter, array delimiter and quote character of
+    the BioCypher batch writer.
+    """
+
+    outdir: str
+    delim: str
+    adelim: str
+    quote: str
+
+    @classmethod
+    def from_config(
+        cls,
+        config_path: str,
+        outdir: str,
+        dbms: str = "neo4j",
+    ) -> "CsvSettings":
+        """
+        Settings of the writer of a BioCypher instance created with
+        `biocypher_config_path=config_path` and `output_directory=outdir`.
+        """
+
+        with open(config_path) as f:
+            config = yaml.safe_load(f) or {}
+        dbms_config = {**_DEFAULT_SETTINGS, **(config.get(dbms) or {})}
+
+        def unescape(value):
+            # '\t' in the config file, as decoded by the batch writer
+            return codecs.decode(str(value), "unicode_escape")
+
+        return cls(
+            outdir=outdir,
+            delim=unescape(dbms_config["delimiter"]),
+            adelim=unescape(dbms_config["array_delimiter"]),
+            quote=str(dbms_config["quote_character"]),
+        )
+
+
+def write_records(bc, kind, records):
+    """
+    Hand node or edge tuples to the matching BioCypher writer.
+    """
+
+    if kind == "nodes":
+        return bc.write_nodes(records)
+    elif kind == "edges":
+        return bc.write_edges(records)
+    raise ValueError(f"Unknown stage kind: {kind}")
+
+
+def _column_specs(header, reference, quote, columns):
+    """
+    How to fill each header column: ('raw' | 'scalar' | 'value', column)
+    for columns taken from the frame, ('const', text) for columns copied
+    from the reference line (labels, preferred id, properties missing in
+    the frame).
+    """
+
+    raw = {":ID": "id", ":START_ID": "source", ":END_ID": "target"}
+    specs = []
+    for name, ref in zip(header, reference):
+        prop, _, suffix = name.partition(":")
+        suffix = ":" + suffix if suffix else ""
+        if name in raw:
+            specs.append(("raw", raw[name]))
+        elif name in (":LABEL", ":TYPE"):
+            specs.append(("const", ref))
+        elif prop == "id":
+            # node property or relationship id column
+            quoted = ref.startswith(quote) and ref.endswith(quote) and len(ref) > 1
+            specs.append(("value" if quoted else "raw", "id"))
+        elif prop not in columns:
+            specs.append(("const", ref))
+        elif suffix in _SCALAR_TYPES:
+            specs.append(("scalar", prop))
+        else:
+            specs.append(("value", prop))
+    return specs
+
+
+def _escape_pandas(values: pd.Series, quote: str) -> pd.Series:
+    return (
+        values.str.replace(quote, quote * 2, regex=False)
+        .str.replace(r"[\r\n]", " ", regex=True)
+    )
+
+
+def _escape_polars(expr: pl.Expr, quote: str) -> pl.Expr:
+    return (
+        expr.str.replace_all(quote, quote * 2, literal=True)
+        .str.replace_all(r"[\r\n]", " ")
+    )
+
+
+def _format_pandas(frame, specs, delim, adelim, quote) -> list:
+    n = len(frame)
+    cols = []
+    for how, arg in specs:
+        if how == "const":
+            cols.append(np.full(n, arg, dtype=object))
+            continue
+
+        s = frame[arg]
+        text = s.astype(str)
+        if how == "value":
+            text = _escape_pandas(text, quote)
+        out = text.to_numpy(dtype=object, na_value="nan")
+        if how == "raw":
+            cols.append(out)
+            continue
+        if how == "value":
+            out = quote + out + quote
+        if s.dtype == object:
+            values = s.to_numpy()
+            lists = np.fromiter(
+                (isinstance(v, list) for v in values), dtype=bool, count=n
+            )
+            if how == "value" and lists.any():
+                out[lists] = [
+                    quote
+                    + adelim.join(_escape_pandas(pd.Series(v, dtype=str), quote))
+                    + quote
+                    for v in values[lists]
+                ]
+            out[values == None] = ""  # noqa: E711
+        cols.append(out)
+
+    lines = cols[0]
+    for col in cols[1:]:
+        lines = lines + delim + col
+    return lines.tolist()
+
+
+def _format_polars(frame, specs, delim, adelim, quote) -> list:
+    exprs = []
+    for how, arg in specs:
+        if how == "const":
+            exprs.append(pl.lit(arg))
+            continue
+
+        col = pl.col(arg)
+        if how == "raw":
+            exprs.append(col.cast(pl.Utf8))
+        elif how == "scalar":
+            exprs.append(col.cast(pl.Utf8).fill_null(""))
+        elif isinstance(frame.schema[arg], pl.List):
+            joined = (
+                col.cast(pl.List(pl.Utf8))
+                .list.eval(_escape_polars(pl.element(), quote))
+                .list.join(adelim)
+            )
+            exprs.append(
+                pl.concat_str([pl.lit(quote), joined, pl.lit(quote)]).fill_null("")
+            )
+        else:
+            escaped = _escape_polars(col.cast(pl.Utf8), quote)
+            exprs.append(
+                pl.concat_str([pl.lit(quote), escaped, pl.lit(quote)]).fill_null("")
+            )
+
+    lines = frame.select(pl.concat_str(exprs, separator=delim).alias("line"))
+    return lines.to_series().to_list()
+
+
+def _format(frame, specs, delim, adelim, quote) -> list:
+    if isinstance(frame, pl.DataFrame):
+        return _format_polars(frame, specs, delim, adelim, quote)
+    return _format_pandas(frame, specs, delim, adelim, quote)
+
+
+def _labels(frame) -> list:
+    if isinstance(frame, pl.DataFrame):
+        return frame["label"].unique(maintain_order=True).to_list()
+    return frame["label"].unique().tolist()
+
+
+def _select_label(frame, label):
+    if isinstance(frame, pl.DataFrame):
+        return frame.filter(pl.col("label") == label)
+    return frame[frame["label"] == label]
+
+
+class _Layout(NamedTuple):
+    prefix: str
+    specs: list
+    columns: tuple
+
+
+class FrameWriter:
+    """
+    Columnar writer of the node and edge frames of one BioCypher instance.
+
+    Args:
+        bc: BioCypher instance
+
+        settings: `CsvSettings` of its batch writer
+
+        batch_size: rows per part file
+    """
+
+    def __init__(
+        self,
+        bc,
+        settings: CsvSettings,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.bc = bc
+        self.settings = settings
+        self.batch_size = batch_size
+        # (kind, label) -> layout of the part files, None if the columnar
+        # path can not be used for the label
+        self._layouts = {}
+
+    @staticmethod
+    def _unique_rows(frame):
+        """
+        The first row of each id of a frame.
+        """
+
+        if isinstance(frame, pl.DataFrame):
+            return frame.unique(subset="id", keep="first", maintain_order=True)
+        return frame.drop_duplicates(subset="id", keep="first")
+
+    def _reference_layout(self, kind, frame) -> Optional[_Layout]:
+        """
+        Write the first row of a label through BioCypher and derive the
+        layout of the part files from the header and the line BioCypher
+        wrote.
+        """
+
+        outdir, delim, adelim, quote = self.settings
+
+        first = next(iter_records(kind, _slice(frame, 0, 1)))
+        before = set(os.listdir(outdir)) if os.path.isdir(outdir) else set()
+        write_records(self.bc, kind, [first])
+        new_parts = [
+            name for name in set(os.listdir(outdir)) - before
+            if "-part" in name and not name.endswith("-header.csv")
+        ]
+        if len(new_parts) != 1:
+            logger.warning(f"Could not find the part file written for {first[-2]}.")
+            return None
+
+        prefix = new_parts[0].split("-part")[0]
+        with open(os.path.join(outdir, f"{prefix}-header.csv")) as f:
+            header = f.read().strip("\n").split(delim)
+        with open(os.path.join(outdir, new_parts[0])) as f:
+            reference = f.read().rstrip("\n")
+
+        fields = reference.split(delim)
+        if len(fields) != len(header):
+            return None
+
+        specs = _column_specs(header, fields, quote, frame.columns)
+        if _format(_slice(frame, 0, 1), specs, delim, adelim, quote) != [reference]:
+            return None
+
+        return _Layout(prefix, specs, tuple(frame.columns))
+
+    def _write_parts(self, frame, layout):
+        outdir, delim, adelim, quote = self.settings
+
+        part = len(glob.glob(os.path.join(outdir, f"{layout.prefix}-part-columnar*.csv")))
+        for batch in iter_batches(frame, self.batch_size):
+            lines = _format(batch, layout.specs, delim, adelim, quote)
+            path = os.path.join(outdir, f"{layout.prefix}-part-columnar{part:03d}.csv")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            part += 1
+
+    def write(self, kind: str, frame):
+        """
+        Write a node or edge frame to the neo4j-admin import files.
+
+        Args:
+            kind: 'nodes' or 'edges'
+
+            frame: pandas or polars data frame, see the module docstring
+        """
+
+        frame = self._unique_rows(frame)
+        if not len(frame):
+            return
+
+        for label in _labels(frame):
+            rows = _select_label(frame, label)
+            start = 0
+
+            key = (kind, label)
+            if key not in self._layouts:
+                self._layouts[key] = self._reference_layout(kind, rows)
+                start = 1
+                if self._layouts[key] is None:
+                    logger.warning(
+                        f"Columnar output not possible for {label}, "
+                        "falling back to the generator path."
+                    )
+
+            rows = _slice(rows, start, len(rows))
+            layout = self._layouts[key]
+            if layout and tuple(rows.columns) != layout.columns:
+                logger.warning(
+                    f"Columns of {label} differ from its first frame, "
+                    "falling back to the generator path."
+                )
+                layout = None
+
+            if layout:
+                self._write_parts(rows, layout)
+                logger.info(f"Wrote {len(rows) + start} {kind} of {label}.")
+            else:
+                write_records(self.bc, kind, iter_records(kind, rows))
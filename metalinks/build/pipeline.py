@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Build pipeline: run adapter stages and feed their output to BioCypher.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+
+from biocypher._logger import logger
+
+from metalinks.build.intermediate import read_intermediate, write_intermediate
+from metalinks.build.neo4j_csv import is_frame, iter_records, write_records
+from metalinks.build.report import StageRecorder
+
+logger.debug(f"Loading module {__name__}.")
+
+
+class Stage(NamedTuple):
+    """
+    One adapter call of the build, e.g. `Stage('edges', STITCH, 'get_edges')`.
+
+    `kind` is either 'nodes' or 'edges' and decides which BioCypher writer
+    receives the output of `getattr(adapter, method)()`. Methods ending in
+    `_frame` return data frames, which are written by the columnar writer
+    (see `metalinks.build.neo4j_csv`).
+    """
+
+    kind: str
+    adapter: object
+    method: str = "get_edges"
+
+    @property
+    def name(self):
+        return f"{type(self.adapter).__name__}.{self.method}"
+
+    @property
+    def columnar(self):
+        return self.method.endswith("_frame")
+
+    def output(self):
+        """
+        Run the adapter; a generator of records, or of data frames for
+        columnar stages.
+        """
+
+        out = getattr(self.adapter, self.method)()
+        if is_frame(out):
+            yield out
+        else:
+            yield from out
+
+
+def write_stage(bc, kind, items, columnar=False, frame_writer=None):
+    """
+    Hand a node or edge generator to the matching BioCypher writer, or the
+    data frames of a columnar stage to the columnar writer. Without a
+    `frame_writer`, the frames are passed to BioCypher as tuples.
+    """
+
+    if not columnar:
+        return write_records(bc, kind, items)
+    for frame in items:
+        if frame_writer is not None:
+            frame_writer.write(kind, frame)
+        else:
+            write_records(bc, kind, iter_records(kind, frame))
+
+
+def run_stages(bc, stages, cache=None, report=None, frame_writer=None):
+    """
+    Run all stages one after another in the calling process.
+
+    Args:
+        bc: BioCypher instance
+
+        stages: list of `Stage`
+
+        cache: optional `BuildCache`; stages with a cached output are
+            skipped and their output is replayed from the cache
+
+        report: optional `RunReport` collecting the metrics of each stage
+
+        frame_writer: optional `FrameWriter` on `bc` writing the frames of
+            columnar stages
+    """
+
+    for stage in stages:
+        recorder = report.stage(stage.name, stage.kind) if report else None
+
+        path = cache.lookup(stage) if cache else None
+        if path:
+            items = cache.replay(path)
+            if recorder:
+                recorder.cached = True
+        else:
+            logger.info(f"Running {stage.name}.")
+            items = stage.output()
+            if cache:
+                items = cache.record(stage, items)
+
+        if recorder:
+            items = recorder.wrap(items, count=len if stage.columnar else None)
+        write_stage(bc, stage.kind, items, stage.columnar, frame_writer)
+
+
+def _materialise_stage(stage, path):
+    """
+    Worker entry point: run one adapter and dump its output to `path`.
+
+    Returns the metrics of the stage; dumping the intermediate counts as
+    part of the emit phase.
+    """
+
+    recorder = StageRecorder(stage.name, stage.kind)
+    count = len if stage.columnar else None
+    write_intermediate(recorder.wrap(stage.output(), count=count), path)
+    stats = recorder.as_dict()
+    phases = stats["phases"]
+    phases["emit"] = round(phases.get("emit", 0.0) + phases.pop("write"), 3)
+    return stats
+
+
+def run_stages_parallel(
+    bc,
+    stages,
+    max_workers: Optional[int] = None,
+    tmp_dir: Optional[str] = None,
+    cache=None,
+    report=None,
+    frame_writer=None,
+):
+    """
+    Run all stages in a process pool and write their output in stage order.
+
+    Every worker turns its adapter generator into an on-disk intermediate.
+    The parent waits for the stages in their original order and replays each
+    intermediate into the BioCypher writer as soon as it is ready, so writing
+    overlaps with the stages still running and the written output is the
+    same as with `run_stages`.
+
+    Args:
+        bc: BioCypher instance
+
+        stages: list of `Stage`
+
+        max_workers: size of the process pool; defaults to one process per
+            stage, capped at the number of CPUs. Lower this if several
+            memory-heavy adapters (e.g. STITCH) would otherwise run at once.
+
+        tmp_dir: parent directory for the intermediates; defaults to the
+            system temporary directory
+
+        cache: optional `BuildCache`; cached stages are not submitted to the
+            pool, and the workers of cacheable stages write their
+            intermediate straight into the cache
+
+        report: optional `RunReport`; wall and CPU time, peak RSS and
+            phases are measured in the worker, the time the parent spends
+            writing the intermediate is reported as 'write'
+
+        frame_writer: optional `FrameWriter` on `bc` writing the frames of
+            columnar stages; it is only used in the parent process
+    """
+
+    if max_workers is None:
+        max_workers = min(len(stages), os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix="metalinks-", dir=tmp_dir) as tmp:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            jobs = []
+            for i, stage in enumerate(stages):
+                path = cache.lookup(stage) if cache else None
+                if path:
+                    jobs.append((stage, path, None, True))
+                    continue
+
+                cached = bool(cache) and cache.is_cacheable(stage)
+                if cached:
+                    path = cache.path(stage)
+                else:
+                    path = os.path.join(tmp, f"{i:02d}_{stage.name}.pkl")
+                future = pool.submit(_materialise_stage, stage, path)
+                jobs.append((stage, path, future, cached))
+
+            for stage, path, future, cached in jobs:
+                if future is not None:
+                    stats = future.result()
+                    logger.info(
+                        f"{stage.name} produced {stats['rows']} {stage.kind}."
+                    )
+                    if cached:
+                        cache.prune(stage, keep=path)
+
+                    t0 = time.perf_counter()
+                    write_stage(
+                        bc, stage.kind, read_intermediate(path), stage.columnar,
+                        frame_writer,
+                    )
+                    write_time = time.perf_counter() - t0
+                    if report:
+                        stats["phases"]["write"] = round(write_time, 3)
+                        wall = stats["wall_time"] + write_time
+                        stats["wall_time"] = round(wall, 3)
+                        stats["rows_per_sec"] = (
+                            round(stats["rows"] / wall, 1) if wall else None
+                        )
+                        report.add(stats)
+
+                else:
+                    items = read_intermediate(path)
+                    if report:
+                        recorder = report.stage(stage.name, stage.kind)
+                        recorder.cached = True
+                        items = recorder.wrap(
+                            items, count=len if stage.columnar else None
+                        )
+                    write_stage(bc, stage.kind, items, stage.columnar, frame_writer)
+
+                if not cached:
+                    os.remove(path)
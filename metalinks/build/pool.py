@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ordered map over a process pool with a bounded number of tasks in flight.
+
+`Executor.map` and submitting every task up front both keep all finished
+results in memory until they are consumed. `map_bounded` submits tasks as
+results are taken, so at most `window` inputs and results exist at a time,
+and drops each result once it has been yielded.
+"""
+
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterable, Iterator
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+
+def map_bounded(
+    pool: Executor,
+    fn: Callable,
+    args: Iterable[tuple],
+    window: int,
+) -> Iterator:
+    """
+    Yield `fn(*a)` for every `a` in `args`, in order.
+
+    Args:
+        pool: executor running the calls
+
+        fn: picklable function
+
+        args: argument tuples; consumed lazily, one per finished call
+
+        window: maximum number of submitted, not yet yielded calls, e.g.
+            twice the number of workers of the pool
+    """
+
+    pending = deque()
+    for a in args:
+        pending.append(pool.submit(fn, *a))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
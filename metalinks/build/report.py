@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-stage run report: timing, throughput and peak memory of each adapter.
+
+Adapters mark their phases by calling `phase('read')`, `phase('transform')`
+etc. from within their generators; the time spent in the generator until
+its first item goes to the phase that is active at that point, the time
+spent in the generator afterwards counts as 'emit'. Time spent outside the
+adapter generator (in the BioCypher writer) is reported as 'write'.
+Without an active recorder `phase` does nothing.
+
+Memory is the resident set size of the process, sampled from
+/proc/self/statm by a background thread while a stage runs: `peak_rss_mb`
+is the highest sample, `rss_delta_mb` its difference to the RSS at the
+start of the stage. Stages replayed from the build cache are not sampled. Where /proc is not available, the process-lifetime
+peak (`ru_maxrss`) is reported instead, which only grows over a run.
+
+Work an adapter hands to child processes is measured there with `measured`
+and attached to the running stage with `add_worker`: the stage lists the
+phases and peak RSS of every worker, and the largest worker peak as
+`workers_peak_rss_mb` ('worker MB' in the summary).
+"""
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+_active = None
+
+RSS_SAMPLE_INTERVAL = 0.05  # seconds
+
+
+def phase(name: str):
+    """
+    Switch the adapter running in this process to phase `name`.
+    """
+
+    if _active is not None:
+        _active.switch(name)
+
+
+def add_worker(stats: dict):
+    """
+    Attach the metrics of a task run in a child process, as returned by
+    `measured`, to the stage running in this process.
+    """
+
+    if _active is not None:
+        _active.workers.append(stats)
+
+
+def measured(name: str, fn, *args, count=None):
+    """
+    Call `fn(*args)` under a recorder of its own, e.g. in a pool worker.
+
+    Args:
+        name: name of the task in the report
+
+        fn: function to call
+
+        count: gives the number of rows of the result, e.g. `len`
+
+    Returns:
+        The result and the metrics of the call: wall and CPU time, peak RSS
+        of this process and the phases `fn` switched through.
+    """
+
+    global _active
+
+    recorder = StageRecorder(name, "step").start()
+    outer, _active = _active, recorder
+    recorder._phase_start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        recorder.switch(recorder.current)
+        recorder._phase_start = None
+        _active = outer
+        recorder.finish()
+
+    recorder.rows = count(result) if count else 1
+    return result, recorder.as_dict()
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def _blank(value):
+    return "" if value is None else value
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _current_rss_mb():
+    """
+    Current resident set size, None where /proc is not available.
+    """
+
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def rss_mb():
+    """
+    Current RSS, or the process peak where the current one is unknown.
+    """
+
+    rss = _current_rss_mb()
+    return _peak_rss_mb() if rss is None else rss
+
+
+class RSSSampler:
+    """
+    Highest RSS of the process between `start` and `stop`, sampled every
+    `RSS_SAMPLE_INTERVAL` seconds by a daemon thread.
+    """
+
+    def __init__(self):
+        self.start_mb = rss_mb()
+        self.peak_mb = self.start_mb
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sample()
+        return self.peak_mb
+
+
+class StageRecorder:
+    """
+    Collects the metrics of one stage.
+    """
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.rows = 0
+        self.cached = False
+        self.phases = {}
+        self.workers = []
+        self.current = "read"
+        self._phase_start = None
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._rss = None
+        self.wall_time = None
+        self.cpu_time = None
+        self.peak_rss_mb = None
+        self.rss_delta_mb = None
+
+    def start(self):
+        """
+        Start sampling the RSS, once the stage actually runs.
+        """
+
+        if self._rss is None:
+            self._rss = RSSSampler().start()
+        return self
+
+    def switch(self, name: str):
+        now = time.perf_counter()
+        if self._phase_start is not None:
+            self.phases[self.current] = (
+                self.phases.get(self.current, 0.0) + now - self._phase_start
+            )
+            self._phase_start = now
+        self.current = name
+
+    def wrap(self, items, count=None):
+        """
+        Pass the items of an adapter generator through, timing the adapter.
+
+        `count` gives the number of rows of an item, e.g. `len` for data
+        frames; by default every item is one row.
+        """
+
+        global _active
+
+        if not self.cached:
+            self.start()
+        it = iter(items)
+        while True:
+            outer, _active = _active, self
+            self._phase_start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            finally:
+                self.switch(self.current)
+                self._phase_start = None
+                _active = outer
+
+            self.rows += count(item) if count else 1
+            if self.current != "emit":
+                self.current = "emit"
+            yield item
+
+        self.finish()
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._wall_start
+        self.cpu_time = time.process_time() - self._cpu_start
+        if self._rss is not None:
+            self.peak_rss_mb = self._rss.stop()
+            self.rss_delta_mb = self.peak_rss_mb - self._rss.start_mb
+
+    def as_dict(self) -> dict:
+        adapter_time = sum(self.phases.values())
+        wall = self.wall_time or 0.0
+        phases = {k: round(v, 3) for k, v in self.phases.items()}
+        if self.kind != "step":
+            phases["write"] = round(max(wall - adapter_time, 0.0), 3)
+        stats = {
+            "stage": self.name,
+            "kind": self.kind,
+            "cached": self.cached,
+            "rows": self.rows,
+            "wall_time": round(wall, 3),
+            "cpu_time": round(self.cpu_time or 0.0, 3),
+            "rows_per_sec": round(self.rows / wall, 1) if wall else None,
+            "peak_rss_mb": _round(self.peak_rss_mb, 1),
+            "rss_delta_mb": _round(self.rss_delta_mb, 1),
+            "phases": phases,
+        }
+        if self.workers:
+            stats["workers"] = self.workers
+            stats["workers_peak_rss_mb"] = max(
+                w["peak_rss_mb"] or 0.0 for w in self.workers
+            )
+        return stats
+
+
+class RunReport:
+    """
+    Report of a full pipeline run, written as JSON.
+    """
+
+    def __init__(self):
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = time.perf_counter()
+        self.stages = []
+
+    def stage(self, name: str, kind: str) -> StageRecorder:
+        recorder = StageRecorder(name, kind)
+        self.stages.append(recorder)
+        return recorder
+
+    def add(self, stats: dict):
+        """
+        Add the metrics of a stage recorded in another process.
+        """
+
+        self.stages.append(stats)
+
+    @contextmanager
+    def block(self, name: str):
+        """
+        Record a step that is not an adapter generator, e.g. a download.
+        """
+
+        recorder = self.stage(name, "step").start()
+        try:
+            yield recorder
+        finally:
+            recorder.finish()
+
+    def as_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "wall_time": round(time.perf_counter() - self._start, 3),
+            "stages": [
+                s if isinstance(s, dict) else s.as_dict() for s in self.stages
+            ],
+        }
+
+    def write(self, out_dir: str = "biocypher-out") -> str:
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d%H%M%S")
+        path = os.path.join(out_dir, f"run_report_{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+        logger.info(f"Wrote run report to {path}.")
+        return path
+
+    def summary(self) -> str:
+        header = (
+            "stage", "rows", "wall s", "cpu s", "rows/s", "peak MB", "+MB",
+            "worker MB", "read", "transform", "emit", "write",
+        )
+        rows = []
+        for s in self.as_dict()["stages"]:
+            p = s["phases"]
+            rows.append((
+                s["stage"] + (" (cached)" if s["cached"] else ""),
+                s["rows"],
+                s["wall_time"],
+                s["cpu_time"],
+                s["rows_per_sec"] or "",
+                _blank(s["peak_rss_mb"]),
+                _blank(s["rss_delta_mb"]),
+                s.get("workers_peak_rss_mb", ""),
+                p.get("read", ""),
+                p.get("transform", ""),
+                p.get("emit", ""),
+                p.get("write", ""),
+            ))
+
+        widths = [
+            max(len(str(r[i])) for r in [header] + rows)
+            for i in range(len(header))
+        ]
+        lines = [
+            "  ".join(str(v).rjust(w) if i else str(v).ljust(w)
+                      for i, (v, w) in enumerate(zip(r, widths)))
+            for r in [header] + rows
+        ]
+        lines.insert(1, "  ".join("-" * w for w in widths))
+        return "\n".join(lines)
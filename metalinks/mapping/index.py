@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent identifier mapping index shared by all adapters.
+
+The index is a SQLite file holding identifier pairs for metabolites
+(HMDB, ChEBI, PubChem, KEGG) and proteins (UniProt, gene symbol, ENSP,
+ENST, ENSG). It is built once per release from pypath and the local
+mapping tables and then queried in bulk by the adapters, instead of every
+adapter rebuilding its own pypath translation tables.
+
+Identifiers are stored in the canonical form of their type, see
+`metalinks.mapping.normalize`.
+
+When an identifier maps to several targets, the local mapping tables take
+precedence over pypath and, within one source, the last row wins, as it
+did with the `dict(zip(...))` tables the adapters used to build.
+
+The index is only written when every pypath source loaded; the sources it
+was built from are stored in its `meta` table, and `get_mapping_index`
+rebuilds an index that lacks any of them, e.g. one written before the
+local mapping table was added.
+"""
+
+import os
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from biocypher._logger import logger
+
+from metalinks.mapping.normalize import normalize_ids
+
+logger.debug(f"Loading module {__name__}.")
+
+# bump to rebuild the index for a new data release
+MAPPING_RELEASE = "2024_1"
+MAPPING_INDEX_DIR = "data/mapping_index"
+MAPPING_INDEX_PATH = os.path.join(
+    MAPPING_INDEX_DIR, f"mapping_index_{MAPPING_RELEASE}.sqlite"
+)
+HMDB_MAPPING_PATH = "data/mapping_tables/hmdb_mapping.csv"
+
+METABOLITE_ID_TYPES = ("hmdb", "chebi", "pubchem", "kegg")
+
+# index id type -> pypath id type
+PYPATH_ID_TYPES = {
+    "uniprot": "uniprot",
+    "genesymbol": "genesymbol",
+    "ensp": "ensp_biomart",
+    "enst": "enst_biomart",
+    "ensg": "ensg_biomart",
+}
+
+PROTEIN_PAIRS = [
+    ("genesymbol", "uniprot"),
+    ("ensp", "uniprot"),
+    ("enst", "ensg"),
+]
+
+# names of the sources in the `sources` entry of the index meta table
+LOCAL_SOURCE = "local:hmdb_mapping"
+PYPATH_SOURCES = ["pypath:hmdb"] + [
+    f"pypath:{source}-{target}" for source, target in PROTEIN_PAIRS
+]
+
+
+class MappingIndexError(Exception):
+    """
+    A source of the mapping index could not be loaded.
+    """
+
+
+def expected_sources() -> list:
+    """
+    Sources a complete index is built from: all pypath sources, and the
+    local mapping table if it exists.
+    """
+
+    local = [LOCAL_SOURCE] if os.path.exists(HMDB_MAPPING_PATH) else []
+    return local + PYPATH_SOURCES
+
+
+def _pairs(df: pd.DataFrame, source: str, target: str) -> pd.DataFrame:
+    """
+    Canonical (source, target) pairs in both directions from two columns.
+    """
+
+    pairs = pd.DataFrame({
+        "source_id": normalize_ids(df[source], source),
+        "target_id": normalize_ids(df[target], target),
+    }).dropna().drop_duplicates()
+
+    forward = pairs.assign(source_type=source, target_type=target)
+    backward = pairs.rename(
+        columns={"source_id": "target_id", "target_id": "source_id"}
+    ).assign(source_type=target, target_type=source)
+
+    return pd.concat([forward, backward], ignore_index=True)
+
+
+def _local_metabolite_ids() -> Optional[pd.DataFrame]:
+    if not os.path.exists(HMDB_MAPPING_PATH):
+        logger.warning(f"{HMDB_MAPPING_PATH} not found, skipping.")
+        return None
+
+    df = pd.read_csv(HMDB_MAPPING_PATH, sep=",", dtype=str)
+    return df.rename(columns={
+        "accession": "hmdb",
+        "chebi_id": "chebi",
+        "pubchem_id": "pubchem",
+        "kegg_id": "kegg",
+    })
+
+
+def _pypath_metabolite_ids() -> pd.DataFrame:
+    from pypath.inputs import hmdb
+
+    df = hmdb.metabolites_table(
+        "accession", "chebi_id", "pubchem_compound_id", "kegg_id"
+    )
+    return df.rename(columns={
+        "accession": "hmdb",
+        "chebi_id": "chebi",
+        "pubchem_compound_id": "pubchem",
+        "kegg_id": "kegg",
+    })
+
+
+def _pypath_protein_pairs(source: str, target: str) -> pd.DataFrame:
+    from pypath.utils import mapping
+
+    src, tgt = PYPATH_ID_TYPES[source], PYPATH_ID_TYPES[target]
+    df = mapping.translation_df(src, tgt)
+
+    # pypath sometimes returns the uniprot/genesymbol columns swapped
+    if {src, tgt} == {"uniprot", "genesymbol"}:
+        if "RORA" not in df["genesymbol"].values:
+            df = df.rename(columns={"genesymbol": "uniprot", "uniprot": "genesymbol"})
+
+    return df.rename(columns={src: source, tgt: target})
+
+
+class MappingIndex:
+    """
+    Read access to a mapping index file; see `build_mapping_index`.
+
+    Pair tables are loaded from the file on first use and kept in memory,
+    so repeated lookups of the same id types are dictionary operations.
+    """
+
+    def __init__(self, path: str = MAPPING_INDEX_PATH):
+        self.path = path
+        self._conn = None
+        self._tables = {}
+
+    def __getstate__(self):
+        # connections cannot be shared with worker processes
+        return {"path": self.path, "_conn": None, "_tables": {}}
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+        return self._conn
+
+    def release(self) -> Optional[str]:
+        return self._meta("release")
+
+    def sources(self) -> list:
+        """
+        Sources the index was built from, empty for indices built before
+        they were recorded.
+        """
+
+        value = self._meta("sources")
+        return value.split(",") if value else []
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def table(self, source: str, target: str) -> pd.Series:
+        """
+        All mappings from `source` to `target` ids as a Series indexed by
+        source id, with the preferred target for each source id.
+        """
+
+        key = (source, target)
+        if key not in self._tables:
+            df = pd.read_sql_query(
+                "SELECT source_id, target_id FROM pairs "
+                "WHERE source_type = ? AND target_type = ? "
+                "ORDER BY source_id, rank",
+                self.conn,
+                params=key,
+            )
+            df = df.drop_duplicates("source_id", keep="first")
+            self._tables[key] = df.set_index("source_id")["target_id"]
+        return self._tables[key]
+
+    def translate(
+        self,
+        ids: Iterable,
+        source: str,
+        target: str,
+        canonical: bool = True,
+    ) -> pd.Series:
+        """
+        Translate identifiers in bulk.
+
+        Args:
+            ids: identifiers of type `source`
+
+            source: id type of the input, e.g. 'pubchem'
+
+            target: id type of the output, e.g. 'hmdb'
+
+            canonical: bring the input into canonical form before lookup
+
+        Returns:
+            Series aligned with `ids`, missing mappings are NA
+        """
+
+        ids = pd.Series(ids, dtype="object")
+        index = ids.index
+        query = normalize_ids(ids, source) if canonical else ids
+
+        result = query.map(self.table(source, target))
+        result.index = index
+        return result
+
+    def metabolites(self) -> pd.DataFrame:
+        """
+        Metabolite identifier rows (hmdb, chebi, pubchem, kegg) of all
+        sources, in canonical form and in order of precedence.
+        """
+
+        return pd.read_sql_query(
+            "SELECT hmdb, chebi, pubchem, kegg FROM metabolite_ids ORDER BY rank",
+            self.conn,
+        )
+
+
+def build_mapping_index(
+    path: str = MAPPING_INDEX_PATH,
+    release: str = MAPPING_RELEASE,
+) -> MappingIndex:
+    """
+    Build the mapping index file from the local mapping tables and pypath.
+
+    Args:
+        path: destination SQLite file
+
+        release: release tag stored in the index
+
+    Returns:
+        `MappingIndex` on the new file
+
+    Raises:
+        MappingIndexError: if a pypath source fails to load; no file is
+            written then
+    """
+
+    logger.info(f"Building identifier mapping index {path}.")
+    t0 = time.time()
+
+    # lookups take the lowest rank: sources are added in order of precedence,
+    # the rows of each source last to first (last one wins)
+
+    try:
+        pypath_metabolites = _pypath_metabolite_ids()
+    except Exception as e:
+        raise MappingIndexError(
+            f"Could not load metabolite ids from pypath: {e}"
+        ) from e
+
+    # metabolites: local table first, it takes precedence
+    local_metabolites = _local_metabolite_ids()
+    sources = [LOCAL_SOURCE] if local_metabolites is not None else []
+    sources.append("pypath:hmdb")
+    metabolite_sources = [
+        df for df in (local_metabolites, pypath_metabolites)
+        if df is not None
+    ]
+    metabolites = pd.concat(
+        [
+            pd.DataFrame({t: normalize_ids(df[t], t) for t in METABOLITE_ID_TYPES})
+            .iloc[::-1]
+            for df in metabolite_sources
+        ],
+        ignore_index=True,
+    ).dropna(subset=["hmdb"]).drop_duplicates()
+
+    pairs = []
+    for i, source in enumerate(METABOLITE_ID_TYPES):
+        for target in METABOLITE_ID_TYPES[i + 1:]:
+            pairs.append(_pairs(metabolites, source, target))
+
+    for source, target in PROTEIN_PAIRS:
+        try:
+            df = _pypath_protein_pairs(source, target)
+        except Exception as e:
+            raise MappingIndexError(
+                f"Could not load {source}->{target} from pypath: {e}"
+            ) from e
+        pairs.append(_pairs(df.iloc[::-1], source, target))
+        sources.append(f"pypath:{source}-{target}")
+
+    pairs = pd.concat(pairs, ignore_index=True)
+    pairs["rank"] = range(len(pairs))
+    metabolites["rank"] = range(len(metabolites))
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    with sqlite3.connect(tmp_path) as conn:
+        pairs.to_sql("pairs", conn, index=False)
+        metabolites.to_sql("metabolite_ids", conn, index=False)
+        conn.execute(
+            "CREATE INDEX pairs_lookup "
+            "ON pairs (source_type, target_type, source_id, rank)"
+        )
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("release", release),
+                ("built", time.strftime("%Y-%m-%d")),
+                ("sources", ",".join(sources)),
+            ],
+        )
+    os.replace(tmp_path, path)
+
+    logger.info(
+        f"Built mapping index with {len(pairs)} pairs "
+        f"in {round((time.time() - t0) / 60, 2)} mins."
+    )
+    return MappingIndex(path)
+
+
+_index = None
+
+
+def get_mapping_index(path: str = MAPPING_INDEX_PATH) -> MappingIndex:
+    """
+    Process-wide mapping index; built on first use if the file is missing
+    or lacks any of the `expected_sources`.
+    """
+
+    global _index
+
+    if _index is None or _index.path != path:
+        if not os.path.exists(path):
+            _index = build_mapping_index(path)
+        else:
+            _index = MappingIndex(path)
+            missing = set(expected_sources()) - set(_index.sources())
+            if missing:
+                logger.info(
+                    f"Mapping index {path} lacks {sorted(missing)}, rebuilding."
+                )
+                _index.conn.close()
+                _index = build_mapping_index(path)
+
+    return _index
+
+
+if __name__ == "__main__":
+    build_mapping_index()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Normalization of identifier columns to the canonical form of each id type:
+
+    hmdb        HMDB0000001 (the 5-digit HMDB00001 form is zero-padded)
+    chebi       CHEBI:15377 (bare numbers get the prefix, floats like
+                15377.0 lose the decimals)
+    pubchem     5202 (floats like 5202.0 lose the decimals)
+    kegg        C00001 (extracted from e.g. 'cpd:C00001')
+    uniprot     P08908
+    genesymbol  HTR1A
+    ensp/enst/ensg  ENSP00000..., without version suffix
+
+Whatever the type, values are stripped of whitespace and quotes, and empty
+strings or the string forms of missing values ('nan', 'None', ...) become
+NA. hmdb, chebi, pubchem and kegg ids that do not match the pattern of
+their type become NA as well; uniprot, genesymbol and Ensembl ids are not
+checked against a pattern.
+
+The functions work on whole columns with the pandas string methods, which
+run on Arrow string kernels when pyarrow is installed. Adapters call them
+on the identifier columns of their inputs before any join or lookup, and
+the mapping index uses the same forms, so the same id from two sources is
+the same string.
+"""
+
+from typing import Iterable, Mapping, Optional
+
+import pandas as pd
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+try:
+    import pyarrow  # noqa: F401
+
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    STRING_DTYPE = pd.StringDtype("python")
+
+MISSING_STRINGS = ["", "nan", "NaN", "None", "<NA>", "NA"]
+
+# metabolite id columns of the mapping tables -> id type
+METABOLITE_ID_COLUMNS = {
+    "chebi_id": "chebi",
+    "kegg_id": "kegg",
+    "hmdb_id": "hmdb",
+    "pubchem_id": "pubchem",
+}
+
+
+def normalize_ids(ids: Iterable, id_type: Optional[str] = None) -> pd.Series:
+    """
+    Bring a column of identifiers of one type into canonical form.
+
+    Args:
+        ids: identifiers, a Series keeps its index
+
+        id_type: one of the types in the module docstring, None to only
+            strip the values and mark missing ones
+
+    Returns:
+        string Series aligned with `ids`, NA where there is no valid id
+    """
+
+    if not isinstance(ids, pd.Series):
+        ids = pd.Series(ids, dtype="object")
+
+    ids = ids.astype(STRING_DTYPE).str.strip().str.strip("\"'")
+    ids = ids.mask(ids.isin(MISSING_STRINGS))
+
+    if id_type == "hmdb":
+        digits = ids.str.extract(r"(?i)^HMDB(\d+)$", expand=False)
+        ids = "HMDB" + digits.str.zfill(7)
+    elif id_type == "chebi":
+        ids = "CHEBI:" + ids.str.extract(r"(?i)^(?:CHEBI:)?(\d+)(?:\.0+)?$", expand=False)
+    elif id_type == "pubchem":
+        ids = ids.str.extract(r"^(?:CID)?(\d+)(?:\.0+)?$", expand=False)
+    elif id_type == "kegg":
+        ids = ids.str.extract(r"(C\d{5})", expand=False)
+    elif id_type in ("ensp", "enst", "ensg"):
+        ids = ids.str.split(".").str[0]
+
+    return ids
+
+
+def normalize_frame(df: pd.DataFrame, columns: Mapping[str, str]) -> pd.DataFrame:
+    """
+    Copy of a data frame with its identifier columns normalized.
+
+    Args:
+        df: input table
+
+        columns: column name -> id type; columns missing from `df` are
+            skipped
+
+    Returns:
+        data frame with the same columns and index as `df`
+    """
+
+    return df.assign(**{
+        column: normalize_ids(df[column], id_type)
+        for column, id_type in columns.items()
+        if column in df
+    })
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Reconciliation of metabolite identifiers across mapping tables.
+
+The missing identifiers of a table are filled from the rows sharing one of
+its identifiers directly, in the table itself and in further mapping
+tables, in one round per id column as the pairwise merges on ChEBI, KEGG,
+HMDB and PubChem ids used to: the round of `chebi_id` looks up every
+ChEBI id of the table in all rows holding it and fills the other missing
+ids of the rows with that ChEBI id, in the table and in the mapping
+tables, so the next rounds see them. No chains of shared ids are followed
+within a round.
+
+A ChEBI id (etc.) with several candidates of one type in its rows is a
+conflict. Depending on `on_conflict`, missing values of that type are
+filled with the candidate of the first table holding one (the table
+itself, then the mapping tables in order; 'first', the default),
+with the candidate seen in most rows ('majority', ties broken by the
+smallest identifier) or not filled from this id ('skip'). Identifiers
+present in a row are never changed.
+
+The connected components of the identifier graph (every row connects the
+identifiers it contains) are only used for reporting: the size of the
+largest component is logged to spot hub ids, such as a generic ChEBI id
+shared by stereoisomers or salts, and components holding several
+identifiers of one type are returned as `conflicts`.
+"""
+
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+ID_COLUMNS = ("chebi_id", "kegg_id", "hmdb_id", "pubchem_id")
+CONFLICT_POLICIES = ("first", "majority", "skip")
+
+
+class Reconciliation(NamedTuple):
+    """
+    Result of `reconcile`: the filled table, the component of each of its
+    rows and one row per conflicting (component, id column) with the
+    competing identifiers.
+    """
+
+    ids: pd.DataFrame
+    components: np.ndarray
+    conflicts: pd.DataFrame
+
+
+def _long(frames: Sequence[pd.DataFrame], columns) -> pd.DataFrame:
+    """
+    All identifiers as (row, column, value), rows numbered across frames.
+    """
+
+    parts = []
+    offset = 0
+    for df in frames:
+        rows = np.arange(offset, offset + len(df))
+        for column in columns:
+            if column not in df:
+                continue
+            values = df[column].to_numpy(dtype=object)
+            present = pd.notna(values)
+            parts.append(pd.DataFrame({
+                "row": rows[present],
+                "column": column,
+                "value": values[present].astype(str),
+            }))
+        offset += len(df)
+
+    if not parts:
+        return pd.DataFrame({"row": [], "column": [], "value": []})
+    return pd.concat(parts, ignore_index=True)
+
+
+def _components(frames: Sequence[pd.DataFrame], columns) -> tuple:
+    """
+    Component of every row of the identifier graph, and the conflicting
+    (component, column) pairs with their identifiers, most frequent first.
+    """
+
+    n_rows = sum(len(f) for f in frames)
+    ids = _long(frames, columns)
+
+    # nodes: distinct (column, value); graph: rows <-> nodes
+    node, _ = pd.factorize(pd.MultiIndex.from_arrays([ids["column"], ids["value"]]))
+    n_nodes = node.max() + 1 if len(node) else 0
+    graph = sparse.coo_matrix(
+        (np.ones(len(ids), dtype=np.int8), (ids["row"].to_numpy(), n_rows + node)),
+        shape=(n_rows + n_nodes, n_rows + n_nodes),
+    )
+    _, labels = connected_components(graph, directed=False)
+    ids["component"] = labels[ids["row"].to_numpy()]
+
+    if n_rows:
+        row_sizes = np.bincount(labels[:n_rows])
+        largest = row_sizes.argmax()
+        n_ids = int((labels[n_rows:] == largest).sum())
+        logger.info(
+            f"Largest id component: {row_sizes[largest]} rows, {n_ids} ids."
+        )
+
+    counts = (
+        ids.groupby(["component", "column", "value"], sort=False)
+        .size()
+        .rename("n")
+        .reset_index()
+        .sort_values(["component", "column", "n", "value"], ascending=[True, True, False, True])
+    )
+    distinct = counts.groupby(["component", "column"], sort=False)["value"]
+    conflicts = (
+        distinct.agg(list)[distinct.size() > 1]
+        .rename("ids")
+        .reset_index()
+    )
+    return labels[:n_rows], conflicts
+
+
+def _lookup(table: pd.DataFrame, key: str, column: str, on_conflict: str) -> tuple:
+    """
+    The `column` id to fill for every `key` id, from the rows holding both.
+
+    Returns:
+        Series of the chosen ids indexed by `key` id, and the number of
+        `key` ids with several candidates
+    """
+
+    rows = table.loc[table[key].notna() & table[column].notna(), [key, column, "_table"]]
+    if on_conflict == "first":
+        # first table, last row within it
+        ranked = rows.iloc[::-1].sort_values("_table", kind="stable")
+    else:
+        ranked = (
+            rows.groupby([key, column], sort=False)
+            .size()
+            .rename("n")
+            .reset_index()
+            .sort_values(["n", column], ascending=[False, True])
+        )
+    chosen = ranked.drop_duplicates(key)
+
+    n_candidates = rows.drop_duplicates([key, column])[key].value_counts()
+    clash = n_candidates.index[n_candidates > 1]
+    if on_conflict == "skip":
+        chosen = chosen[~chosen[key].isin(clash)]
+
+    return chosen.set_index(key)[column], len(clash)
+
+
+def reconcile(
+    df: pd.DataFrame,
+    sources: Sequence[pd.DataFrame] = (),
+    columns: Sequence[str] = ID_COLUMNS,
+    on_conflict: str = "first",
+) -> Reconciliation:
+    """
+    Fill the missing identifiers of a table from the rows sharing one of
+    its identifiers, in itself and in further mapping tables.
+
+    Args:
+        df: table to fill, e.g. the metabolite annotations of a model
+
+        sources: mapping tables with (some of) the same id columns, in
+            order of precedence
+
+        columns: id columns, one round per column in this order
+
+        on_conflict: 'first', 'majority' or 'skip', see the module
+            docstring
+
+    Returns:
+        `Reconciliation` with a copy of `df`, missing values filled
+    """
+
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"Unknown conflict policy: {on_conflict}")
+
+    frames = [df, *sources]
+    components, conflicts = _components(frames, columns)
+    columns = [c for c in columns if c in df]
+
+    table = pd.concat(
+        [
+            f.reindex(columns=columns).astype(object).assign(_table=i)
+            for i, f in enumerate(frames)
+        ],
+        ignore_index=True,
+    )
+    own = (table["_table"] == 0).to_numpy()
+    missing = {c: int(table.loc[own, c].isna().sum()) for c in columns}
+
+    for key in columns:
+        # only the ids of the table itself are looked up
+        keys = table.loc[own, key].dropna().unique()
+        keyed = table[key].isin(keys)
+        fills = {}
+        for column in columns:
+            if column == key:
+                continue
+            lookup, n_conflicts = _lookup(table[keyed], key, column, on_conflict)
+            fills[column] = table[key].map(lookup)
+            if n_conflicts:
+                logger.info(
+                    f"Reconciling {column} by {key}: {n_conflicts} "
+                    f"{key}s with several candidates."
+                )
+        for column, fill in fills.items():
+            table[column] = table[column].where(table[column].notna(), fill)
+
+    out = df.copy()
+    for column in columns:
+        values = table.loc[own, column].to_numpy(dtype=object)
+        filled = missing[column] - int(pd.isna(values).sum())
+        out[column] = values
+        logger.info(
+            f"Reconciled {column}: filled {filled} of {missing[column]} missing."
+        )
+
+    return Reconciliation(out, components[:len(df)], conflicts)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bulk resolution of gene symbols and UniProt accessions.
+
+Replaces per-item `mapping.map_name` calls: a whole array of identifiers is
+looked up in the mapping index at once, and identifiers without a mapping
+fall back to the curated `missing_symbols.csv` table.
+"""
+
+from functools import lru_cache
+from typing import Iterable
+
+import pandas as pd
+
+from biocypher._logger import logger
+
+from metalinks.mapping.index import get_mapping_index
+
+logger.debug(f"Loading module {__name__}.")
+
+MISSING_SYMBOLS_PATH = 'data/mapping_tables/missing_symbols.csv'
+
+
+@lru_cache
+def _missing_symbols(path: str = MISSING_SYMBOLS_PATH) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype=str)
+    return df.dropna(subset=['symbol', 'uniprot'])
+
+
+def _fallback(source: str, target: str) -> pd.Series:
+    """
+    Curated fallback mappings between gene symbols and UniProt accessions.
+    """
+
+    df = _missing_symbols()
+    if (source, target) == ('genesymbol', 'uniprot'):
+        df = df.drop_duplicates('symbol')
+        return pd.Series(df['uniprot'].values, index=df['symbol'].values)
+    if (source, target) == ('uniprot', 'genesymbol'):
+        df = df.drop_duplicates('uniprot')
+        return pd.Series(df['symbol'].values, index=df['uniprot'].values)
+    return pd.Series(dtype='object')
+
+
+def resolve_ids(ids: Iterable, source: str, target: str) -> pd.Series:
+    """
+    Translate an array of identifiers in one pass.
+
+    Args:
+        ids: identifiers of type `source`
+
+        source: id type of the input, e.g. 'genesymbol'
+
+        target: id type of the output, e.g. 'uniprot'
+
+    Returns:
+        Series aligned with `ids`; identifiers found neither in the mapping
+        index nor in the fallback table are NA
+    """
+
+    ids = pd.Series(ids, dtype='object')
+    result = get_mapping_index().translate(ids, source, target)
+
+    missing = result.isna() & ids.notna()
+    if missing.any():
+        result[missing] = ids[missing].map(_fallback(source, target))
+
+    return result
+
+
+def resolve_uniprot(symbols: Iterable) -> pd.Series:
+    """
+    UniProt accessions for an array of gene symbols.
+    """
+
+    return resolve_ids(symbols, 'genesymbol', 'uniprot')
+
+
+def resolve_genesymbols(accessions: Iterable) -> pd.Series:
+    """
+    Gene symbols for an array of UniProt accessions.
+    """
+
+    return resolve_ids(accessions, 'uniprot', 'genesymbol')
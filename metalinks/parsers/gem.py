@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cached loader for genome-scale metabolic models (GEMs) saved as MATLAB
+structs, e.g. Recon3D_301.mat and Human-GEM.mat.
+
+Only the fields used by the GEM adapters are kept: the stoichiometric
+matrix `S` (metabolites x reactions), `rxnGeneMat` (reactions x genes), the
+reaction, metabolite and gene ids, the flux bounds, the subsystems and the
+metabolite annotations in `METABOLITE_FIELDS` that the model has. The model
+is the one struct variable of the file, whatever its name, so a newer
+release of a model loads without changes as long as it has these fields.
+
+On first use, the fields are converted into a cache directory under
+`GEM_CACHE_DIR`: the sparse matrices as CSC component arrays (.npy), the
+per-reaction, per-metabolite and per-gene fields as uncompressed Arrow IPC
+tables. Later runs memory-map the cache instead of parsing the .mat file.
+A cache directory is named after the size and modification time of its
+source and is rebuilt when either changes.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import scipy.io as sio
+from scipy import sparse
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+GEM_CACHE_DIR = "data/gem_cache"
+CACHE_VERSION = 1
+
+MATRIX_FIELDS = {"S": "S", "rxnGeneMat": "rxn_gene"}
+
+# struct field -> column of the metabolite table; of several fields for the
+# same column, the first one the model has is used
+METABOLITE_FIELDS = {
+    "metHMDBID": "hmdb_id",
+    "metKEGGID": "kegg_id",
+    "metPubChemID": "pubchem_id",
+    "metCHEBIID": "chebi_id",
+    "metChEBIID": "chebi_id",
+}
+
+_SPARSE_PARTS = ("data", "indices", "indptr")
+
+
+class GEM(NamedTuple):
+    """
+    The fields of a model used by the GEM adapters.
+
+    `reactions` has the columns id, lb, ub, subsystem; `metabolites` has id
+    and the annotation columns of `METABOLITE_FIELDS` found in the model;
+    `genes` has id. Their rows follow the rows and columns of `S` and
+    `rxn_gene`.
+    """
+
+    S: sparse.csc_matrix
+    rxn_gene: sparse.csc_matrix
+    reactions: pd.DataFrame
+    metabolites: pd.DataFrame
+    genes: pd.DataFrame
+
+
+def _string(value) -> Optional[str]:
+    """
+    First string of a (nested) MATLAB cell, None if the cell is empty.
+    """
+
+    while isinstance(value, np.ndarray):
+        if value.size == 0:
+            return None
+        value = value.flat[0]
+    return str(value)
+
+
+def _strings(cells) -> list:
+    return [_string(cell) for cell in np.asarray(cells, dtype=object).flat]
+
+
+def _model_variable(path: str) -> str:
+    structs = [name for name, _, cls in sio.whosmat(path) if cls == "struct"]
+    if len(structs) != 1:
+        raise ValueError(
+            f"Expected one model struct in {path}, found {structs or 'none'}."
+        )
+    return structs[0]
+
+
+def _read_mat(path: str) -> dict:
+    """
+    Read the used fields of the model struct into sparse matrices and
+    polars tables.
+    """
+
+    name = _model_variable(path)
+    logger.info(f"Reading model {name} from {path}.")
+    struct = sio.loadmat(path, variable_names=[name])[name][0, 0]
+    fields = struct.dtype.names
+
+    def field(key):
+        if key not in fields:
+            raise KeyError(f"Model {name} in {path} has no field {key}.")
+        return struct[key]
+
+    tables = {
+        "reactions": pl.DataFrame({
+            "id": _strings(field("rxns")),
+            "lb": np.asarray(field("lb"), dtype=np.float64).ravel(),
+            "ub": np.asarray(field("ub"), dtype=np.float64).ravel(),
+            "subsystem": _strings(field("subSystems")),
+        }),
+        "genes": pl.DataFrame({"id": _strings(field("genes"))}),
+    }
+
+    metabolites = {"id": _strings(field("mets"))}
+    for key, column in METABOLITE_FIELDS.items():
+        if key in fields and column not in metabolites:
+            metabolites[column] = _strings(struct[key])
+    tables["metabolites"] = pl.DataFrame(metabolites, schema={c: pl.Utf8 for c in metabolites})
+
+    matrices = {
+        out: sparse.csc_matrix(field(key)) for key, out in MATRIX_FIELDS.items()
+    }
+
+    return {"matrices": matrices, "tables": tables}
+
+
+def _cache_path(path: str, cache_dir: str):
+    stat = os.stat(path)
+    key = f"{stat.st_size}:{stat.st_mtime_ns}:{CACHE_VERSION}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}.{digest}"), name
+
+
+def _write_cache(model: dict, out_path: str):
+    for name, m in model["matrices"].items():
+        m.sort_indices()
+        for part in _SPARSE_PARTS:
+            np.save(os.path.join(out_path, f"{name}.{part}.npy"), getattr(m, part))
+        np.save(os.path.join(out_path, f"{name}.shape.npy"), np.asarray(m.shape))
+
+    for name, table in model["tables"].items():
+        table.write_ipc(os.path.join(out_path, f"{name}.arrow"), compression="uncompressed")
+
+
+def _read_cache(path: str) -> GEM:
+    def matrix(name):
+        parts = [
+            np.load(os.path.join(path, f"{name}.{part}.npy"), mmap_mode="r")
+            for part in _SPARSE_PARTS
+        ]
+        shape = tuple(np.load(os.path.join(path, f"{name}.shape.npy")))
+        return sparse.csc_matrix(tuple(parts), shape=shape)
+
+    def table(name):
+        # memory-mapped by polars, the files are uncompressed
+        df = pl.read_ipc(os.path.join(path, f"{name}.arrow"))
+        return pd.DataFrame(df.to_dict(as_series=False), columns=df.columns)
+
+    return GEM(
+        S=matrix("S"),
+        rxn_gene=matrix("rxn_gene"),
+        reactions=table("reactions"),
+        metabolites=table("metabolites"),
+        genes=table("genes"),
+    )
+
+
+def load_gem(path: str, cache_dir: str = GEM_CACHE_DIR) -> GEM:
+    """
+    Load a model from its cache, converting the .mat file first if the
+    cache is missing or stale.
+
+    Args:
+        path: .mat file holding the model struct
+
+        cache_dir: directory of the converted models
+
+    Returns:
+        `GEM` with the used fields of the model
+    """
+
+    out_path, name = _cache_path(path, cache_dir)
+
+    if not os.path.exists(out_path):
+        model = _read_mat(path)
+        logger.info(f"Caching {path} in {out_path}.")
+        tmp_path = out_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        _write_cache(model, tmp_path)
+        os.replace(tmp_path, out_path)
+        for old in glob.glob(os.path.join(cache_dir, f"{name}.*")):
+            if old != out_path:
+                shutil.rmtree(old, ignore_errors=True)
+
+    return _read_cache(out_path)
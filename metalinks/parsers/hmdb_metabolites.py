@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming parser for hmdb_metabolites.xml.
+
+Yields flat metabolite records with only the requested fields: scalars as
+str or float, repeated elements as lists of str. See `METABOLITE_FIELDS`
+for the available fields.
+
+Usage as a script:
+
+    python -m metalinks.parsers.hmdb_metabolites hmdb_metabolites.zip out.csv
+
+Add `--workers N` to parse the dump in N processes.
+"""
+
+import argparse
+from typing import Iterator, Optional, Sequence
+
+import pandas as pd
+
+from biocypher._logger import logger
+
+from metalinks.parsers.hmdb_xml import (
+    DEFAULT_BATCH_SIZE,
+    Field,
+    iter_records,
+    iter_tables,
+    read_table,
+)
+
+logger.debug(f"Loading module {__name__}.")
+
+HMDB_METABOLITES_URL = "https://hmdb.ca/system/downloads/current/hmdb_metabolites.zip"
+HMDB_METABOLITES_PATH = "data/HMDB/hmdb_metabolites.zip"
+
+METABOLITE_FIELDS = {
+    "accession": Field("accession"),
+    "status": Field("status"),
+    "name": Field("name"),
+    "chemical_formula": Field("chemical_formula"),
+    "average_molecular_weight": Field("average_molecular_weight", convert=float),
+    "monisotopic_molecular_weight": Field(
+        "monisotopic_molecular_weight", convert=float
+    ),
+    "smiles": Field("smiles"),
+    "inchi": Field("inchi"),
+    "inchikey": Field("inchikey"),
+    "kegg_id": Field("kegg_id"),
+    "chebi_id": Field("chebi_id"),
+    "pubchem_compound_id": Field("pubchem_compound_id"),
+    "secondary_accessions": Field("secondary_accessions/accession", True),
+    "direct_parent": Field("taxonomy/direct_parent"),
+    "kingdom": Field("taxonomy/kingdom"),
+    "super_class": Field("taxonomy/super_class"),
+    "class": Field("taxonomy/class"),
+    "sub_class": Field("taxonomy/sub_class"),
+    "molecular_framework": Field("taxonomy/molecular_framework"),
+    "cellular_locations": Field(
+        "biological_properties/cellular_locations/cellular", True
+    ),
+    "biospecimen_locations": Field(
+        "biological_properties/biospecimen_locations/biospecimen", True
+    ),
+    "tissue_locations": Field(
+        "biological_properties/tissue_locations/tissue", True
+    ),
+    "pathways": Field("biological_properties/pathways/pathway/name", True),
+    "diseases": Field("diseases/disease/name", True),
+    "proteins": Field("protein_associations/protein/protein_accession", True),
+}
+
+# fields of the HMDB metabolite nodes
+NODE_FIELDS = [
+    "accession",
+    "kegg_id",
+    "chebi_id",
+    "pubchem_compound_id",
+    "name",
+    "cellular_locations",
+    "biospecimen_locations",
+    "tissue_locations",
+    "pathways",
+    "diseases",
+    "kingdom",
+    "class",
+    "sub_class",
+    "molecular_framework",
+]
+
+
+def _fields(fields: Optional[Sequence[str]]) -> dict:
+    if fields is None:
+        return METABOLITE_FIELDS
+    unknown = set(fields) - set(METABOLITE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown HMDB metabolite fields: {sorted(unknown)}")
+    return {f: METABOLITE_FIELDS[f] for f in fields}
+
+
+def iter_metabolites(
+    path: str = HMDB_METABOLITES_PATH,
+    fields: Optional[Sequence[str]] = None,
+) -> Iterator[dict]:
+    """
+    Yield one dict per metabolite.
+
+    Args:
+        path: hmdb_metabolites.xml, plain or as .zip/.gz
+
+        fields: names of the fields to extract, defaults to all
+    """
+
+    return iter_records(path, "metabolite", _fields(fields))
+
+
+def iter_metabolite_tables(
+    path: str = HMDB_METABOLITES_PATH,
+    fields: Optional[Sequence[str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the metabolites as data frames of at most `batch_size` rows,
+    parsed in `workers` processes if more than one.
+    """
+
+    return iter_tables(path, "metabolite", _fields(fields), batch_size, workers)
+
+
+def metabolites_table(
+    path: str = HMDB_METABOLITES_PATH,
+    fields: Optional[Sequence[str]] = None,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    All metabolites as one data frame with one column per field, parsed in
+    `workers` processes if more than one.
+    """
+
+    return read_table(path, "metabolite", _fields(fields), workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("in_path", help="hmdb_metabolites.xml, .zip or .gz")
+    parser.add_argument("out_path", help="output CSV")
+    parser.add_argument(
+        "--fields",
+        nargs="+",
+        default=None,
+        choices=list(METABOLITE_FIELDS),
+        help="fields to extract, defaults to all",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="parser processes, 0 for one per CPU",
+    )
+    args = parser.parse_args()
+
+    df = metabolites_table(args.in_path, args.fields, args.workers)
+    df.to_csv(args.out_path, index=False)
+
+
+if __name__ == "__main__":
+    main()
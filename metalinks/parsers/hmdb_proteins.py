@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming parser for hmdb_proteins.xml.
+
+Yields flat protein records with only the requested fields: scalars as str,
+repeated elements as lists of str. See `PROTEIN_FIELDS` for the available
+fields.
+
+The protein mapping table (`hmdbp_id`, `uniprot`, `gene_name`,
+`metabolites`, `pathways`) read by `HMDBAdapter.get_edges_frame` is written
+with `write_protein_mapping` as Parquet, list columns as list columns, and
+read back with `read_protein_mapping`. A .csv path gives the older CSV
+layout instead, list columns joined by `|`, as in the table shipped in
+data/mapping_tables.
+
+Usage as a script:
+
+    python -m metalinks.parsers.hmdb_proteins hmdb_proteins.zip \
+        data/mapping_tables/hmdb_protein_mapping.parquet --mapping
+
+Add `--workers N` to parse the dump in N processes.
+"""
+
+import argparse
+from typing import Iterator, Optional, Sequence
+
+import pandas as pd
+import polars as pl
+
+from biocypher._logger import logger
+
+from metalinks.parsers.hmdb_xml import (
+    DEFAULT_BATCH_SIZE,
+    Field,
+    iter_records,
+    iter_tables,
+    read_table,
+)
+
+logger.debug(f"Loading module {__name__}.")
+
+HMDB_PROTEINS_URL = "https://hmdb.ca/system/downloads/current/hmdb_proteins.zip"
+HMDB_PROTEINS_PATH = "data/HMDB/hmdb_proteins.zip"
+
+PROTEIN_FIELDS = {
+    "accession": Field("accession"),
+    "secondary_accessions": Field("secondary_accessions/accession", True),
+    "name": Field("name"),
+    "protein_type": Field("protein_type"),
+    "gene_name": Field("gene_name"),
+    "uniprot_id": Field("uniprot_id"),
+    "genbank_protein_id": Field("genbank_protein_id"),
+    "hgnc_id": Field("hgnc_id"),
+    "metabolites": Field("metabolite_associations/metabolite/accession", True),
+    "pathways": Field("pathways/pathway/name", True),
+}
+
+# fields of the protein mapping table and their column names there
+MAPPING_FIELDS = {
+    "accession": "hmdbp_id",
+    "uniprot_id": "uniprot",
+    "gene_name": "gene_name",
+    "metabolites": "metabolites",
+    "pathways": "pathways",
+}
+LIST_SEPARATOR = "|"
+
+
+def _fields(fields: Optional[Sequence[str]]) -> dict:
+    if fields is None:
+        return PROTEIN_FIELDS
+    unknown = set(fields) - set(PROTEIN_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown HMDB protein fields: {sorted(unknown)}")
+    return {f: PROTEIN_FIELDS[f] for f in fields}
+
+
+def iter_proteins(
+    path: str = HMDB_PROTEINS_PATH,
+    fields: Optional[Sequence[str]] = None,
+) -> Iterator[dict]:
+    """
+    Yield one dict per protein.
+
+    Args:
+        path: hmdb_proteins.xml, plain or as .zip/.gz
+
+        fields: names of the fields to extract, defaults to all
+    """
+
+    return iter_records(path, "protein", _fields(fields))
+
+
+def iter_protein_tables(
+    path: str = HMDB_PROTEINS_PATH,
+    fields: Optional[Sequence[str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the proteins as data frames of at most `batch_size` rows, parsed
+    in `workers` processes if more than one.
+    """
+
+    return iter_tables(path, "protein", _fields(fields), batch_size, workers)
+
+
+def proteins_table(
+    path: str = HMDB_PROTEINS_PATH,
+    fields: Optional[Sequence[str]] = None,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    All proteins as one data frame with one column per field, parsed in
+    `workers` processes if more than one.
+    """
+
+    return read_table(path, "protein", _fields(fields), workers)
+
+
+def protein_mapping_table(
+    path: str = HMDB_PROTEINS_PATH,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    HMDB protein ids with their UniProt id, gene name, associated
+    metabolites and pathways; proteins without UniProt id are dropped.
+    """
+
+    df = proteins_table(path, list(MAPPING_FIELDS), workers)
+    df = df[df["uniprot_id"].notna()]
+    return df.rename(columns=MAPPING_FIELDS).reset_index(drop=True)
+
+
+def _list_columns(df: pd.DataFrame) -> list:
+    return [
+        c for c in df.columns
+        if df[c].dtype == object and df[c].map(type).eq(list).any()
+    ]
+
+
+def write_protein_mapping(df: pd.DataFrame, out_path: str):
+    """
+    Write a protein table to Parquet, or to CSV with list columns joined by
+    `LIST_SEPARATOR` if `out_path` ends in .csv.
+    """
+
+    lists = _list_columns(df)
+
+    if out_path.endswith(".csv"):
+        df = df.assign(**{c: df[c].str.join(LIST_SEPARATOR) for c in lists})
+        df.to_csv(out_path, index=False)
+        return
+
+    # str and list of str columns, see the module docstring
+    schema = {c: pl.List(pl.Utf8) if c in lists else pl.Utf8 for c in df.columns}
+    table = pl.DataFrame(
+        {c: df[c].astype(object).where(df[c].notna(), None).tolist() for c in df.columns},
+        schema=schema,
+    )
+    table.write_parquet(out_path)
+
+
+def read_protein_mapping(
+    path: str,
+    columns: Optional[Sequence[str]] = None,
+) -> pd.DataFrame:
+    """
+    Read a table written by `write_protein_mapping`.
+    """
+
+    if path.endswith(".csv"):
+        return pd.read_csv(path, sep=",", usecols=columns)
+
+    table = pl.read_parquet(path, columns=list(columns) if columns else None)
+    return pd.DataFrame(table.to_dict(as_series=False), columns=table.columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("in_path", help="hmdb_proteins.xml, .zip or .gz")
+    parser.add_argument("out_path", help="output .parquet, or .csv")
+    parser.add_argument(
+        "--fields",
+        nargs="+",
+        default=None,
+        choices=list(PROTEIN_FIELDS),
+        help="fields to extract, defaults to all",
+    )
+    parser.add_argument(
+        "--mapping",
+        action="store_true",
+        help="write the protein mapping table read by the HMDB adapter",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="parser processes, 0 for one per CPU",
+    )
+    args = parser.parse_args()
+
+    if args.mapping:
+        df = protein_mapping_table(args.in_path, args.workers)
+    else:
+        df = proteins_table(args.in_path, args.fields, args.workers)
+    write_protein_mapping(df, args.out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Scraper for the HMDB reaction pages (https://hmdb.ca/reactions/<id>).
+
+Pages are fetched concurrently from an asyncio event loop, with at most
+`concurrency` requests in flight and at most `rate` requests started per
+second; failed requests are retried with exponential backoff. Every page
+is stored as raw HTML under `<cache_dir>/<id>.html` (ids that do not exist
+get an empty `<id>.missing` marker) before it is parsed, so an interrupted
+run resumes where it stopped and a re-run only parses the cached pages.
+Only pages with a reaction panel and its Status block are cached; anything
+else served with HTTP 200 (rate-limit or error pages) is retried, and is
+fetched again on the next run if the retries run out. The ids of the
+cached pages are appended to `<cache_dir>/index.txt`, so a re-run skips
+them without reading the pages; cached pages missing from the index (e.g.
+from an interrupted run) are checked in a worker thread.
+Pages are parsed with `get_PD` in a process pool while the download goes
+on, and the reactions are returned in the order of their ids.
+
+The output is the table read by `HMDBAdapter.get_edges_frame`
+(data/HMDB/hmdb_reactions_full_status.csv).
+
+Usage as a script:
+
+    python -m metalinks.parsers.hmdb_reactions \
+        data/HMDB/hmdb_reactions_full_status.csv --concurrency 8 --rate 5
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+HMDB_REACTIONS_URL = "https://hmdb.ca/reactions"
+HMDB_REACTIONS_CACHE = "data/HMDB/reactions"
+N_REACTIONS = 18202  # number of reactions in HMDB these days
+
+# column names of get_PD in the reaction table read by the adapter
+OUTPUT_COLUMNS = {"Type": "direction", "Status": "status"}
+
+_MISSING = ".missing"
+_INDEX = "index.txt"
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+BACKOFF = 1.0  # seconds before the first retry, doubled on every attempt
+
+
+def get_PD(reaction_page):
+
+    # parse the html using beautiful soup
+    soup = BeautifulSoup(reaction_page, 'html.parser')
+
+    # find all the reaction panels
+    reaction = soup.find(class_='reaction-panel')
+
+    # extract all the metabolite ids
+    metabolite_ids = re.findall(r'/metabolites/(HMDB\d+)', str(reaction))
+
+    status = reaction.text.split('Status')[1].strip()
+    status = status.split(' ')[0]
+
+    enzyme_id = re.search(r'/proteins/(HMDBP\d+)', str(reaction)).group(1)
+
+    reaction_str = soup.find(class_='panel-heading').text
+    # split reaction string by either + or = and count how many object were before the =
+    reactands, products = reaction_str.split('=')
+    reactands = reactands.split('+')
+
+    reactand_ids = metabolite_ids[:len(reactands)]
+    product_ids = metabolite_ids[len(reactands):]
+
+    df = pd.DataFrame({'HMDBP': enzyme_id,
+                       'Metabolite': reactand_ids + product_ids,
+                       'Type': ['Reactand'] * len(reactand_ids) + ['Product'] * len(product_ids),
+                       'Status': status})
+
+    return df
+
+
+def _cache_path(cache_dir: str, reaction_id: int) -> str:
+    return os.path.join(cache_dir, f"{reaction_id}.html")
+
+
+def _is_reaction_page(page: str) -> bool:
+    """
+    Whether a page has the parts `get_PD` reads, checked without parsing.
+    """
+
+    return "reaction-panel" in page and "Status" in page
+
+
+def _is_cached(path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return _is_reaction_page(f.read())
+
+
+def _read_index(cache_dir: str) -> set:
+    """
+    Ids of the pages recorded as cached in `cache_dir`.
+    """
+
+    path = os.path.join(cache_dir, _INDEX)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {int(line) for line in f if line.strip().isdigit()}
+
+
+def _parse_file(path: str) -> Optional[pd.DataFrame]:
+    """
+    Worker entry point: parse one cached page, None if that fails.
+    """
+
+    with open(path, encoding="utf-8") as f:
+        page = f.read()
+    try:
+        return get_PD(page)
+    except Exception:
+        return None
+
+
+_local = threading.local()
+
+
+def _get(url: str, timeout: float):
+    """
+    GET with one `requests.Session` per thread.
+    """
+
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    response = _local.session.get(url, timeout=timeout)
+    return response.status_code, response.text
+
+
+class _RateLimiter:
+    """
+    Spaces the start of requests by at least 1 / `rate` seconds.
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self._interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self._interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+async def _download(reaction_id, url, path, threads, limiter, timeout, retries):
+    """
+    Fetch one page into the cache. Returns whether the page exists; raises
+    nothing, pages that could not be fetched are retried on the next run.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    for attempt in range(1, retries + 1):
+        await limiter.wait()
+        try:
+            status, text = await loop.run_in_executor(threads, _get, url, timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            logger.warning(
+                f"Request for reaction {reaction_id} failed "
+                f"(attempt {attempt}/{retries}): {e}"
+            )
+            status = None
+
+        if status == 200:
+            if _is_reaction_page(text):
+                _write_atomic(path, text)
+                return True
+            logger.warning(
+                f"Reaction {reaction_id}: page without reaction status, "
+                f"not cached (attempt {attempt}/{retries})."
+            )
+        elif status == 404:
+            _write_atomic(path[:-len(".html")] + _MISSING, "")
+            return False
+        elif status is not None and status not in _RETRY_STATUS:
+            logger.warning(f"Reaction {reaction_id}: HTTP {status}.")
+            return False
+
+        await asyncio.sleep(min(BACKOFF * 2 ** (attempt - 1), 30))
+
+    logger.warning(f"Giving up on reaction {reaction_id} after {retries} attempts.")
+    return False
+
+
+async def _scrape(
+    ids,
+    cache_dir,
+    base_url,
+    concurrency,
+    rate,
+    workers,
+    timeout,
+    retries,
+):
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    limiter = _RateLimiter(rate)
+    counts = {"fetched": 0, "cached": 0, "missing": 0, "unparsed": 0}
+    indexed = _read_index(cache_dir)
+
+    with ThreadPoolExecutor(concurrency) as threads, \
+            ProcessPoolExecutor(workers) as processes, \
+            open(os.path.join(cache_dir, _INDEX), "a") as index:
+
+        def record(reaction_id):
+            index.write(f"{reaction_id}\n")
+            index.flush()
+
+        async def scrape_one(reaction_id):
+            path = _cache_path(cache_dir, reaction_id)
+
+            if reaction_id in indexed and os.path.exists(path):
+                counts["cached"] += 1
+            elif await loop.run_in_executor(threads, _is_cached, path):
+                counts["cached"] += 1
+                record(reaction_id)
+            elif os.path.exists(path[:-len(".html")] + _MISSING):
+                counts["missing"] += 1
+                return None
+            else:
+                async with slots:
+                    url = f"{base_url}/{reaction_id}"
+                    found = await _download(
+                        reaction_id, url, path, threads, limiter, timeout, retries
+                    )
+                if not found:
+                    counts["missing"] += 1
+                    return None
+                counts["fetched"] += 1
+                record(reaction_id)
+
+            df = await loop.run_in_executor(processes, _parse_file, path)
+            if df is None:
+                counts["unparsed"] += 1
+                logger.warning(f"Could not parse reaction {reaction_id}.")
+            return df
+
+        results = await asyncio.gather(*(scrape_one(i) for i in ids))
+
+    logger.info(
+        f"Reactions: {counts['fetched']} fetched, {counts['cached']} cached, "
+        f"{counts['missing']} missing, {counts['unparsed']} not parsed."
+    )
+    return [df for df in results if df is not None]
+
+
+def scrape_reactions(
+    ids: Optional[Iterable[int]] = None,
+    cache_dir: str = HMDB_REACTIONS_CACHE,
+    base_url: str = HMDB_REACTIONS_URL,
+    concurrency: int = 8,
+    rate: Optional[float] = 5.0,
+    workers: Optional[int] = None,
+    timeout: float = 30,
+    retries: int = 5,
+) -> pd.DataFrame:
+    """
+    Scrape the HMDB reaction pages into one table of reaction participants.
+
+    Args:
+        ids: reaction ids, defaults to 1 to `N_REACTIONS`
+
+        cache_dir: directory of the raw HTML pages
+
+        base_url: pages are fetched from `<base_url>/<id>`
+
+        concurrency: maximum number of requests in flight
+
+        rate: maximum number of requests started per second, None for no
+            limit
+
+        workers: number of parser processes, defaults to one per CPU
+
+        timeout: connect and read timeout in seconds
+
+        retries: attempts per page on connection errors, timeouts, HTTP 429
+            and 5xx
+
+    Returns:
+        data frame with the columns HMDBP, Metabolite, direction, status
+    """
+
+    ids = range(1, N_REACTIONS + 1) if ids is None else ids
+    os.makedirs(cache_dir, exist_ok=True)
+
+    dfs = asyncio.run(
+        _scrape(
+            ids,
+            cache_dir,
+            base_url.rstrip("/"),
+            concurrency,
+            rate,
+            workers,
+            timeout,
+            retries,
+        )
+    )
+
+    if not dfs:
+        return pd.DataFrame(columns=["HMDBP", "Metabolite", *OUTPUT_COLUMNS.values()])
+
+    res = pd.concat(dfs, ignore_index=True).drop_duplicates(ignore_index=True)
+    return res.rename(columns=OUTPUT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("out_path", help="output CSV")
+    parser.add_argument("--cache-dir", default=HMDB_REACTIONS_CACHE)
+    parser.add_argument("--base-url", default=HMDB_REACTIONS_URL)
+    parser.add_argument("--first", type=int, default=1, help="first reaction id")
+    parser.add_argument(
+        "--last", type=int, default=N_REACTIONS, help="last reaction id"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--rate", type=float, default=5.0, help="requests per second, 0 for no limit"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="parser processes"
+    )
+    args = parser.parse_args()
+
+    df = scrape_reactions(
+        range(args.first, args.last + 1),
+        cache_dir=args.cache_dir,
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        rate=args.rate or None,
+        workers=args.workers,
+    )
+    df.to_csv(args.out_path, index=False)
+
+
+if __name__ == "__main__":
+    main()
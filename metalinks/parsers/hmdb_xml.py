@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming parser for the HMDB XML dumps (hmdb_metabolites.xml,
+hmdb_proteins.xml).
+
+The dumps are sequences of record elements (`<metabolite>`, `<protein>`)
+under one root element. They are read with `iterparse`; every record is
+reduced to the requested fields as soon as its end tag has been read and
+then cleared, so memory use does not depend on the size of the file.
+
+Fields are addressed by child paths relative to the record element, e.g.
+`biological_properties/pathways/pathway/name`, never by descendant-wide
+searches, so that nested elements with the same tag (the `<accession>` of
+secondary accessions, `<name>` of pathways) are not picked up by accident.
+
+With `workers > 1` the file is split into byte ranges aligned to the start
+tags of the records. Each range is parsed in a worker process, wrapped in
+the root element of the dump, and the per-range tables are returned in file
+order, so the output is the same as with a single process. Compressed
+dumps are extracted next to the archive first.
+"""
+
+import gzip
+import os
+import re
+import shutil
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional
+from xml.etree.ElementTree import iterparse
+
+import pandas as pd
+
+from biocypher._logger import logger
+
+from metalinks.build.pool import map_bounded
+
+logger.debug(f"Loading module {__name__}.")
+
+DEFAULT_BATCH_SIZE = 10_000
+# upper bound of the size of one byte range in parallel mode
+RANGE_SIZE = 1 << 26
+_SCAN_CHUNK = 1 << 20
+
+
+class Field(NamedTuple):
+    """
+    One output column: the child path of its element(s) in the record,
+    whether it collects all matches into a list, and a type conversion for
+    the element text.
+    """
+
+    path: str
+    multiple: bool = False
+    convert: Callable = str
+
+
+def open_xml(path: str):
+    """
+    Open an XML dump as a binary stream; `.zip` (first member) and `.gz`
+    archives are decompressed on the fly.
+    """
+
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        name = next(n for n in archive.namelist() if n.endswith(".xml"))
+        return archive.open(name)
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _qualify(path: str, namespace: Optional[str]) -> str:
+    if not namespace:
+        return path
+    return "/".join(f"{{{namespace}}}{step}" for step in path.split("/"))
+
+
+def _text(elem, convert):
+    text = elem.text
+    if text is None:
+        return None
+    text = text.strip()
+    if not text:
+        return None
+    try:
+        return convert(text)
+    except ValueError:
+        return None
+
+
+def _extractor(fields: Dict[str, Field], namespace: Optional[str]):
+    """
+    Function turning a record element into a dict of the requested fields.
+    """
+
+    compiled = [
+        (name, _qualify(field.path, namespace), field.multiple, field.convert)
+        for name, field in fields.items()
+    ]
+
+    def extract(record) -> dict:
+        out = {}
+        for name, path, multiple, convert in compiled:
+            if multiple:
+                values = (_text(e, convert) for e in record.iterfind(path))
+                out[name] = [v for v in values if v is not None]
+            else:
+                elem = record.find(path)
+                out[name] = None if elem is None else _text(elem, convert)
+        return out
+
+    return extract
+
+
+def parse_records(
+    stream,
+    tag: str,
+    fields: Dict[str, Field],
+) -> Iterator[dict]:
+    """
+    Yield one dict per record element of an XML stream.
+
+    Args:
+        stream: binary file object
+
+        tag: local name of the record elements, e.g. 'metabolite'
+
+        fields: output column names and their `Field`
+    """
+
+    root = None
+    extract = None
+    depth = 0
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+                namespace = elem.tag[1:].split("}")[0] if elem.tag[0] == "{" else None
+                record_tag = f"{{{namespace}}}{tag}" if namespace else tag
+                extract = _extractor(fields, namespace)
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1 and elem.tag == record_tag:
+            yield extract(elem)
+            # drop the finished record from the tree
+            root.clear()
+
+
+def iter_records(
+    path: str,
+    tag: str,
+    fields: Dict[str, Field],
+) -> Iterator[dict]:
+    """
+    Yield one dict per record of an HMDB XML dump (plain, .zip or .gz).
+    """
+
+    with open_xml(path) as stream:
+        yield from parse_records(stream, tag, fields)
+
+
+def records_to_frame(records: Iterable[dict], columns) -> pd.DataFrame:
+    """
+    Collect records column by column into a data frame.
+    """
+
+    data = {c: [] for c in columns}
+    appends = [(c, data[c].append) for c in columns]
+    for record in records:
+        for c, append in appends:
+            append(record[c])
+    return pd.DataFrame(data, columns=list(columns))
+
+
+def plain_xml(path: str) -> str:
+    """
+    Path of the uncompressed dump; `.zip` and `.gz` archives are extracted
+    next to the archive, unless an up to date copy exists.
+    """
+
+    if not path.endswith((".zip", ".gz")):
+        return path
+
+    target = os.path.splitext(path)[0]
+    if not target.endswith(".xml"):
+        target += ".xml"
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+
+    logger.info(f"Extracting {path} to {target}.")
+    tmp_path = target + ".tmp"
+    with open_xml(path) as src, open(tmp_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, _SCAN_CHUNK)
+    os.replace(tmp_path, target)
+    return target
+
+
+def _root_tags(path: str):
+    """
+    The start tag of the root element, as found in the file, and the
+    matching end tag.
+    """
+
+    with open(path, "rb") as f:
+        head = f.read(_SCAN_CHUNK)
+    # skip the XML declaration, processing instructions and comments
+    match = re.search(rb"<([A-Za-z_][\w.-]*)[^>]*>", head)
+    if match is None:
+        raise ValueError(f"No root element found in {path}.")
+    return match.group(0), b"</" + match.group(1) + b">"
+
+
+def _find(f, pattern: bytes, start: int, end: int) -> int:
+    """
+    Offset of the first occurrence of `pattern` in the byte range
+    [start, end) of a file, or `end`.
+    """
+
+    pos = start
+    while pos < end:
+        f.seek(pos)
+        chunk = f.read(min(_SCAN_CHUNK + len(pattern), end - pos))
+        i = chunk.find(pattern)
+        if i >= 0:
+            return pos + i
+        if len(chunk) <= len(pattern):
+            break
+        pos += len(chunk) - len(pattern)
+    return end
+
+
+def record_ranges(path: str, tag: str, n: int) -> list:
+    """
+    Split a dump into at most `n` byte ranges, each starting at the start
+    tag of a record, ending before the start tag of the next range and
+    together covering all records.
+    """
+
+    size = os.path.getsize(path)
+    start_tag = f"<{tag}>".encode()
+    end_tag = f"</{tag}>".encode()
+
+    with open(path, "rb") as f:
+        first = _find(f, start_tag, 0, size)
+        # end of the last record: the last end tag before the root end tag
+        tail = max(first, size - _SCAN_CHUNK)
+        f.seek(tail)
+        last = f.read().rfind(end_tag)
+        end = tail + last + len(end_tag) if last >= 0 else first
+
+        bounds = [first]
+        for i in range(1, n):
+            pos = first + (end - first) * i // n
+            pos = _find(f, start_tag, max(pos, bounds[-1] + 1), end)
+            if pos < end:
+                bounds.append(pos)
+        bounds.append(end)
+
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+class _RangeStream:
+    """
+    File-like view of a byte range of a file, between a prefix and a suffix.
+    """
+
+    def __init__(self, path, start, end, prefix, suffix):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+        self._prefix = prefix
+        self._suffix = suffix
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._remaining + len(self._prefix) + len(self._suffix)
+        out = b""
+        if self._prefix:
+            out, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(out) < size and self._remaining:
+            data = self._file.read(min(size - len(out), self._remaining))
+            self._remaining -= len(data)
+            out += data
+        if len(out) < size and not self._remaining:
+            n = size - len(out)
+            out, self._suffix = out + self._suffix[:n], self._suffix[n:]
+        return out
+
+    def close(self):
+        self._file.close()
+
+
+def _parse_range(path, start, end, root_tags, tag, fields) -> pd.DataFrame:
+    """
+    Worker entry point: parse the records of one byte range.
+    """
+
+    stream = _RangeStream(path, start, end, *root_tags)
+    try:
+        return records_to_frame(parse_records(stream, tag, fields), fields)
+    finally:
+        stream.close()
+
+
+def iter_tables_parallel(
+    path: str,
+    tag: str,
+    fields: Dict[str, Field],
+    workers: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Parse a dump in a process pool and yield one data frame per byte range,
+    in file order.
+
+    Args:
+        path: the dump; compressed dumps are extracted first
+
+        tag: local name of the record elements
+
+        fields: output column names and their `Field`
+
+        workers: number of processes, defaults to one per CPU
+    """
+
+    path = plain_xml(path)
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    # a few ranges per worker to balance the load, none larger than RANGE_SIZE
+    n = max(workers * 4, -(-size // RANGE_SIZE))
+    ranges = record_ranges(path, tag, n)
+    root_tags = _root_tags(path)
+
+    logger.info(
+        f"Parsing {path} in {len(ranges)} ranges with {workers} processes."
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # at most two ranges per worker parsed ahead of the consumer
+        yield from map_bounded(
+            pool,
+            _parse_range,
+            ((path, start, end, root_tags, tag, fields) for start, end in ranges),
+            window=2 * workers,
+        )
+
+
+def iter_tables(
+    path: str,
+    tag: str,
+    fields: Dict[str, Field],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the records of a dump as data frames of at most `batch_size`
+    rows, parsed in `workers` processes if more than one.
+    """
+
+    if workers != 1:
+        for table in iter_tables_parallel(path, tag, fields, workers):
+            for start in range(0, len(table), batch_size):
+                yield table.iloc[start:start + batch_size]
+        return
+
+    batch = []
+    for record in iter_records(path, tag, fields):
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield records_to_frame(batch, fields)
+            batch = []
+    if batch:
+        yield records_to_frame(batch, fields)
+
+
+def read_table(
+    path: str,
+    tag: str,
+    fields: Dict[str, Field],
+    workers: int = 1,
+) -> pd.DataFrame:
+    """
+    All records of a dump as one data frame, parsed in `workers` processes
+    if more than one.
+    """
+
+    if workers != 1:
+        tables = list(iter_tables_parallel(path, tag, fields, workers))
+        if not tables:
+            return records_to_frame([], fields)
+        return pd.concat(tables, ignore_index=True)
+
+    return records_to_frame(iter_records(path, tag, fields), fields)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming parser for the Rhea reaction file (rhea-reactions.txt), plain or
+gzip-compressed as released (rhea-reactions.txt.gz).
+
+Only the ENTRY and EQUATION lines are parsed, with precompiled patterns
+working on bytes. Every ChEBI participant of an equation becomes one row
+(reaction, chebi, side, symbol), appended to typed arrays instead of
+building per-entry dicts and tuples.
+
+The file is read in blocks cut at ENTRY lines, so no entry spans two
+blocks. With more than one worker, the blocks are parsed in a process pool
+while the next ones are read (and decompressed); the rows are returned in
+file order either way.
+"""
+
+import gzip
+import os
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from biocypher._logger import logger
+
+from metalinks.build.pool import map_bounded
+
+logger.debug(f"Loading module {__name__}.")
+
+RHEA_REACTIONS_URL = "https://ftp.expasy.org/databases/rhea/txt/rhea-reactions.txt.gz"
+BLOCK_SIZE = 1 << 24
+
+# codes of the side and symbol columns
+SIDES = ("left", "right")
+SYMBOLS = ("=", "=>", "<=>", "<=")
+
+_LINE = re.compile(rb"^(ENTRY|EQUATION)[ \t]+([^\r\n]*)", re.M)
+_ENTRY = re.compile(rb"RHEA:(\d+)")
+_ARROW = re.compile(rb" (<=>|=>|<=|=) ")
+_CHEBI = re.compile(rb"CHEBI:(\d+)")
+_SYMBOL_CODES = {s.encode(): i for i, s in enumerate(SYMBOLS)}
+
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_blocks(path: str, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Consecutive blocks of about `block_size` bytes of the (decompressed)
+    file, each starting at an ENTRY line.
+    """
+
+    rest = b""
+    with _open(path) as f:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\nENTRY") + 1
+            if cut:
+                yield data[:cut]
+                rest = data[cut:]
+            else:
+                rest = data
+    if rest:
+        yield rest
+
+
+def parse_block(block: bytes):
+    """
+    Worker entry point: the participants of the entries of one block as
+    typed arrays (reaction, chebi, side, symbol).
+    """
+
+    reaction = array("i")
+    chebi = array("i")
+    side = array("b")
+    symbol = array("b")
+
+    current = None
+    for match in _LINE.finditer(block):
+        key, value = match.groups()
+        if key == b"ENTRY":
+            entry = _ENTRY.search(value)
+            current = int(entry.group(1)) if entry else None
+            continue
+
+        arrow = _ARROW.search(value) if current is not None else None
+        if arrow is None:
+            continue
+        left = _CHEBI.findall(value, 0, arrow.start())
+        right = _CHEBI.findall(value, arrow.end())
+        chebi.extend(map(int, left))
+        chebi.extend(map(int, right))
+        n = len(left) + len(right)
+        reaction.extend([current] * n)
+        side.extend([0] * len(left) + [1] * len(right))
+        symbol.extend([_SYMBOL_CODES[arrow.group(1)]] * n)
+
+    return reaction, chebi, side, symbol
+
+
+def _frame(parts) -> pd.DataFrame:
+    columns = list(zip(*parts)) or [(), (), (), ()]
+
+    def concat(arrays, dtype):
+        return np.concatenate(
+            [np.frombuffer(a, dtype=dtype) for a in arrays] or [np.empty(0, dtype)]
+        )
+
+    reaction, chebi, side, symbol = columns
+    return pd.DataFrame({
+        "reaction": concat(reaction, np.intc).astype(np.int32),
+        "chebi": concat(chebi, np.intc).astype(np.int32),
+        "side": pd.Categorical.from_codes(concat(side, np.int8), SIDES),
+        "symbol": pd.Categorical.from_codes(concat(symbol, np.int8), SYMBOLS),
+    })
+
+
+def parse_reactions(
+    path: str,
+    workers: int = 1,
+    block_size: int = BLOCK_SIZE,
+) -> pd.DataFrame:
+    """
+    Parse the ChEBI participants of all Rhea reactions.
+
+    Args:
+        path: rhea-reactions.txt, or the .gz release
+
+        workers: number of parser processes, 0 or None for one per CPU
+
+        block_size: approximate size of the blocks handed to the workers
+
+    Returns:
+        data frame with the columns reaction (Rhea number, int32), chebi
+        (ChEBI number, int32), side ('left' or 'right' of the equation
+        symbol) and symbol (one of `SYMBOLS`), in file order
+    """
+
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        return _frame([parse_block(b) for b in iter_blocks(path, block_size)])
+
+    logger.info(f"Parsing {path} with {workers} processes.")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # blocks are read while the workers parse the ones before, at most
+        # two per worker ahead of the parsed ones
+        blocks = ((b,) for b in iter_blocks(path, block_size))
+        return _frame(list(map_bounded(pool, parse_block, blocks, window=2 * workers)))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Columnar cache of the STITCH TSV files.
+
+On first use, the human rows of the actions and detailed links files are
+converted into Parquet files under `STITCH_CACHE_DIR`: the chemical ids as
+integer CIDs (plus whether the id was a merged `CIDm` or a stereo `CIDs`
+id), the proteins as ENSP ids without the taxon prefix, the scores as
+small integers. Strings (ENSP ids, modes) are dictionary-encoded and all
+columns zstd-compressed by the Parquet writer. The conversion is a
+streaming query, so it does not load the TSVs into memory.
+
+The rows are also partitioned once, at conversion: every row gets the
+bucket `cid % N_BUCKETS` and the file is sorted by it, so each row group
+holds few buckets. A query on a range of buckets (`in_buckets`) only reads
+the row groups whose statistics overlap the range, and splitting the
+chemicals into partitions costs no extra pass over the data.
+
+Later runs scan the Parquet files, which polars memory-maps and reads with
+projection and predicate pushdown. A cache file is named after the size
+and modification time of its source and is rebuilt when either changes.
+"""
+
+import glob
+import hashlib
+import os
+
+import polars as pl
+
+from biocypher._logger import logger
+
+logger.debug(f"Loading module {__name__}.")
+
+STITCH_CACHE_DIR = "data/Stitch/cache"
+CACHE_VERSION = 2
+N_BUCKETS = 64
+
+# approximate bytes per value of the cached columns, for `estimated_size`
+_DTYPE_BYTES = {pl.Boolean: 1, pl.UInt8: 1, pl.Int16: 2, pl.Int32: 4}
+_STRING_BYTES = 24
+
+# score columns of the detailed links file, in file order
+DETAIL_SCORES = [
+    "experimental",
+    "prediction",
+    "database",
+    "textmining",
+    "combined_score",
+]
+
+
+def _cache_path(path: str, cache_dir: str):
+    stat = os.stat(path)
+    key = f"{stat.st_size}:{stat.st_mtime_ns}:{CACHE_VERSION}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    name = os.path.basename(path).rsplit(".tsv", 1)[0]
+    return os.path.join(cache_dir, f"{name}.{digest}.parquet"), name
+
+
+def _cached(query: pl.LazyFrame, path: str, cache_dir: str) -> pl.LazyFrame:
+    """
+    Scan the cache file of a source, writing it from `query` if it is
+    missing or stale.
+    """
+
+    out_path, name = _cache_path(path, cache_dir)
+
+    if not os.path.exists(out_path):
+        logger.info(f"Converting {path} to {out_path}.")
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = out_path + ".tmp"
+        query.with_columns(
+            (pl.col("cid") % N_BUCKETS).cast(pl.UInt8).alias("bucket")
+        ).sort("bucket").sink_parquet(
+            tmp_path, compression="zstd", statistics=True
+        )
+        os.replace(tmp_path, out_path)
+        for old in glob.glob(os.path.join(cache_dir, f"{name}.*.parquet")):
+            if old != out_path:
+                os.remove(old)
+
+    return pl.scan_parquet(out_path)
+
+
+def _chemical(col: pl.Expr):
+    """
+    CID and merged flag of a STITCH chemical id (CIDm00001234).
+    """
+
+    return [
+        col.str.slice(4, None).cast(pl.Int32).alias("cid"),
+        (col.str.slice(3, 1) == "m").alias("merged"),
+    ]
+
+
+def _protein(col: pl.Expr):
+    return col.str.slice(5, None).alias("protein")
+
+
+def stitch_actions(path: str, cache_dir: str = STITCH_CACHE_DIR) -> pl.LazyFrame:
+    """
+    Chemical-protein actions with the columns cid, merged, protein, mode
+    and bucket; both orientations of the source file are folded into one.
+    """
+
+    a_is_protein = pl.col("item_id_a").str.starts_with("9606.")
+    b_is_protein = pl.col("item_id_b").str.starts_with("9606.")
+    chemical = pl.when(a_is_protein).then(pl.col("item_id_b")).otherwise(pl.col("item_id_a"))
+    protein = pl.when(a_is_protein).then(pl.col("item_id_a")).otherwise(pl.col("item_id_b"))
+
+    query = (
+        pl.scan_csv(path, separator="\t")
+        .filter(a_is_protein ^ b_is_protein)
+        .select(*_chemical(chemical), _protein(protein), pl.col("mode"))
+    )
+    return _cached(query, path, cache_dir)
+
+
+def stitch_details(path: str, cache_dir: str = STITCH_CACHE_DIR) -> pl.LazyFrame:
+    """
+    Chemical-protein links with the columns cid, merged, protein, the
+    channel scores `DETAIL_SCORES` and bucket.
+    """
+
+    query = (
+        pl.scan_csv(path, separator="\t")
+        .filter(pl.col("protein").str.starts_with("9606."))
+        .select(
+            *_chemical(pl.col("chemical")),
+            _protein(pl.col("protein")),
+            *[pl.col(c).cast(pl.Int16) for c in DETAIL_SCORES],
+        )
+    )
+    return _cached(query, path, cache_dir)
+
+
+def in_buckets(partition: int, n_partitions: int) -> pl.Expr:
+    """
+    Filter on the rows of one of `n_partitions` contiguous bucket ranges.
+    """
+
+    lo = partition * N_BUCKETS // n_partitions
+    hi = (partition + 1) * N_BUCKETS // n_partitions
+    return (pl.col("bucket") >= lo) & (pl.col("bucket") < hi)
+
+
+def estimated_size(table: pl.LazyFrame) -> int:
+    """
+    Approximate in-memory size of a cached table in bytes, from its row
+    count (Parquet metadata) and column types.
+    """
+
+    rows = table.select(pl.len()).collect().item()
+    # collect_schema from polars 1.0 on, schema before
+    schema = table.collect_schema() if hasattr(table, "collect_schema") else table.schema
+    width = sum(
+        _DTYPE_BYTES.get(dtype, _STRING_BYTES if dtype == pl.Utf8 else 8)
+        for dtype in schema.values()
+    )
+    return rows * width
+
+
+def collect_streaming(query: pl.LazyFrame) -> pl.DataFrame:
+    """
+    Collect a query with the streaming engine: `engine="streaming"` on
+    polars >= 1.23, `streaming=True` before (the argument is removed in
+    polars 2).
+    """
+
+    version = tuple(int(v) for v in pl.__version__.split(".")[:2])
+    if version >= (1, 23):
+        return query.collect(engine="streaming")
+    return query.collect(streaming=True)
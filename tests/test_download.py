@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from metalinks.build.download import DownloadError, download_file, download_files
+
+CONTENT = bytes(range(256)) * 64
+
+
+class _Handler(BaseHTTPRequestHandler):
+    content = CONTENT
+    ignore_range = False
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, headers, body=b""):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send(200, {"Content-Length": str(len(self.content))})
+
+    def do_GET(self):
+        if self.path == "/missing":
+            self._send(404, {"Content-Length": "0"})
+            return
+
+        total = len(self.content)
+        range_header = self.headers.get("Range")
+        self.requests.append(range_header)
+
+        if range_header is None or self.ignore_range:
+            self._send(200, {"Content-Length": str(total)}, self.content)
+            return
+
+        start = int(range_header.split("=")[1].rstrip("-"))
+        if start >= total:
+            body = b"range not satisfiable"
+            self._send(416, {
+                "Content-Range": f"bytes */{total}",
+                "Content-Length": str(len(body)),
+            }, body)
+            return
+
+        body = self.content[start:]
+        self._send(206, {
+            "Content-Range": f"bytes {start}-{total - 1}/{total}",
+            "Content-Length": str(len(body)),
+        }, body)
+
+
+@pytest.fixture
+def server():
+    handler = type("Handler", (_Handler,), {"requests": []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _download(url, tmp_path, part=None, **kwargs):
+    path = tmp_path / "file.bin"
+    if part is not None:
+        (tmp_path / "file.bin.part").write_bytes(part)
+    download_file(url + "/file.bin", str(path), **kwargs)
+    assert not (tmp_path / "file.bin.part").exists()
+    return path.read_bytes()
+
+
+def test_resumes_from_partial_file(server, tmp_path):
+    url, handler = server
+
+    assert _download(url, tmp_path, part=CONTENT[:1000]) == CONTENT
+    assert handler.requests == ["bytes=1000-"]
+
+
+def test_complete_partial_file_is_kept_on_416(server, tmp_path):
+    url, handler = server
+
+    assert _download(url, tmp_path, part=CONTENT) == CONTENT
+    assert handler.requests == [f"bytes={len(CONTENT)}-"]
+
+
+def test_oversized_partial_file_is_downloaded_again(server, tmp_path):
+    url, handler = server
+
+    assert _download(url, tmp_path, part=CONTENT + b"garbage") == CONTENT
+    assert handler.requests == [f"bytes={len(CONTENT) + 7}-", None]
+
+
+def test_server_ignoring_range_restarts(server, tmp_path):
+    url, handler = server
+    handler.ignore_range = True
+
+    assert _download(url, tmp_path, part=CONTENT[:1000]) == CONTENT
+
+
+def test_checksum(server, tmp_path):
+    url, _ = server
+    md5 = hashlib.md5(CONTENT).hexdigest()
+
+    assert _download(url, tmp_path, checksum=f"md5:{md5}") == CONTENT
+
+    with pytest.raises(DownloadError, match="md5 mismatch"):
+        download_file(url + "/file.bin", str(tmp_path / "other.bin"), checksum="md5:0")
+    assert not (tmp_path / "other.bin").exists()
+    assert not (tmp_path / "other.bin.part").exists()
+
+
+def test_download_files_skips_failed_optional_files(server, tmp_path):
+    url, _ = server
+    present, missing = str(tmp_path / "present.bin"), str(tmp_path / "missing.bin")
+    mappings = {url + "/file.bin": present, url + "/missing": missing}
+
+    assert download_files(mappings, optional=[missing]) == [present, None]
+
+    with pytest.raises(DownloadError, match="HTTP 404"):
+        download_files(mappings)
@@ -0,0 +1,131 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("bs4")
+
+import metalinks.parsers.hmdb_reactions as hmdb_reactions  # noqa: E402
+from metalinks.parsers.hmdb_reactions import scrape_reactions  # noqa: E402
+
+PAGE = """<html><body>
+<div class="panel-heading">A + B = C</div>
+<div class="reaction-panel">
+<a href="/metabolites/HMDB1{id:06d}">A</a>
+<a href="/metabolites/HMDB0000002">B</a>
+<a href="/metabolites/HMDB0000003">C</a>
+<a href="/proteins/HMDBP{id:05d}">enzyme</a>
+Status Experimental
+</div>
+</body></html>"""
+
+RATE_LIMITED = "<html><body>Too many requests, slow down.</body></html>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # reaction id -> responses served before the page, then the page
+    before = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        reaction_id = int(self.path.rsplit("/", 1)[1])
+        self.requests.append(reaction_id)
+
+        if reaction_id == 404:
+            status, body = 404, ""
+        elif self.before.get(reaction_id):
+            status, body = self.before[reaction_id].pop(0)
+        else:
+            status, body = 200, PAGE.format(id=reaction_id)
+
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(hmdb_reactions, "BACKOFF", 0)
+    handler = type("Handler", (_Handler,), {"before": {}, "requests": []})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/reactions", handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _scrape(url, cache_dir, ids, **kwargs):
+    return scrape_reactions(
+        ids, cache_dir=str(cache_dir), base_url=url, rate=None, workers=1, **kwargs
+    )
+
+
+def test_pages_are_parsed_and_cached(server, tmp_path):
+    url, handler = server
+
+    df = _scrape(url, tmp_path, [1, 2])
+
+    assert list(df.columns) == ["HMDBP", "Metabolite", "direction", "status"]
+    assert df["HMDBP"].tolist() == ["HMDBP00001"] * 3 + ["HMDBP00002"] * 3
+    assert df["direction"].tolist()[:3] == ["Reactand", "Reactand", "Product"]
+    assert set(df["status"]) == {"Experimental"}
+
+    # the second run reads the cache only
+    n = len(handler.requests)
+    assert _scrape(url, tmp_path, [1, 2]).equals(df)
+    assert len(handler.requests) == n
+
+
+def test_missing_reactions_are_marked(server, tmp_path):
+    url, handler = server
+
+    assert _scrape(url, tmp_path, [404]).empty
+    assert (tmp_path / "404.missing").exists()
+
+    _scrape(url, tmp_path, [404])
+    assert handler.requests == [404]
+
+
+def test_server_errors_are_retried(server, tmp_path):
+    url, handler = server
+    handler.before[5] = [(503, "")] * 2
+
+    df = _scrape(url, tmp_path, [5], retries=3)
+
+    assert df["HMDBP"].unique().tolist() == ["HMDBP00005"]
+    assert handler.requests == [5, 5, 5]
+
+
+def test_rate_limit_pages_are_retried_and_not_cached(server, tmp_path):
+    url, handler = server
+    handler.before[6] = [(200, RATE_LIMITED)]
+    handler.before[7] = [(200, RATE_LIMITED)] * 2
+
+    df = _scrape(url, tmp_path, [6, 7], retries=2)
+
+    assert df["HMDBP"].unique().tolist() == ["HMDBP00006"]
+    assert not (tmp_path / "7.html").exists()
+
+    # given up on, fetched again on the next run
+    df = _scrape(url, tmp_path, [6, 7], retries=2)
+    assert df["HMDBP"].unique().tolist() == ["HMDBP00006", "HMDBP00007"]
+
+
+def test_unindexed_cached_pages_are_checked(server, tmp_path):
+    url, handler = server
+    (tmp_path / "8.html").write_text(PAGE.format(id=8))
+    (tmp_path / "9.html").write_text(RATE_LIMITED)
+
+    df = _scrape(url, tmp_path, [8, 9])
+
+    assert handler.requests == [9]
+    assert df["HMDBP"].unique().tolist() == ["HMDBP00008", "HMDBP00009"]
+    assert (tmp_path / "index.txt").read_text().split() == ["8", "9"]
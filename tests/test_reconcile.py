@@ -0,0 +1,78 @@
+import pandas as pd
+
+from metalinks.mapping.reconcile import reconcile
+
+
+def _ids(rows):
+    return pd.DataFrame(
+        rows, columns=["chebi_id", "kegg_id", "hmdb_id", "pubchem_id"]
+    )
+
+
+def test_fills_from_rows_sharing_an_id():
+    df = _ids([[None, "C00001", None, None]])
+    source = _ids([["CHEBI:1", "C00001", "HMDB0000001", "1"]])
+
+    out = reconcile(df, [source])
+
+    assert out.ids.loc[0].tolist() == ["CHEBI:1", "C00001", "HMDB0000001", "1"]
+    assert out.conflicts.empty
+
+
+def test_chains_are_not_followed_within_a_round():
+    # model row -(C00001)- mapping row -(CHEBI:1)- mapping row with the HMDB id
+    df = _ids([[None, "C00001", None, None]])
+    source = _ids([
+        ["CHEBI:1", "C00001", None, None],
+        ["CHEBI:1", None, "HMDB0000001", "1"],
+    ])
+
+    out = reconcile(df, [source])
+
+    assert out.ids.loc[0, "chebi_id"] == "CHEBI:1"
+    assert pd.isna(out.ids.loc[0, "hmdb_id"])
+
+
+def test_first_table_wins_conflicts():
+    df = _ids([
+        ["CHEBI:9", None, None, None],
+        ["CHEBI:9", "C00004", "HMDB0000004", None],
+    ])
+    source = _ids([["CHEBI:9", "C00003", "HMDB0000003", None]])
+
+    out = reconcile(df, [source])
+
+    assert out.ids.loc[0, "hmdb_id"] == "HMDB0000004"
+    assert out.ids.loc[0, "kegg_id"] == "C00004"
+
+
+def test_skip_keeps_direct_fills_in_conflicting_components():
+    # two stereoisomers share a generic ChEBI id
+    df = _ids([
+        ["CHEBI:9", None, None, None],
+        [None, "C00002", None, None],
+    ])
+    source = _ids([
+        ["CHEBI:9", "C00002", "HMDB0000002", None],
+        ["CHEBI:9", "C00003", "HMDB0000003", None],
+    ])
+
+    out = reconcile(df, [source], on_conflict="skip")
+
+    assert pd.isna(out.ids.loc[0, "hmdb_id"])
+    assert out.ids.loc[1, "hmdb_id"] == "HMDB0000002"
+    assert set(out.conflicts["column"]) == {"hmdb_id", "kegg_id"}
+
+
+def test_majority_fills_conflicts_with_most_frequent_id():
+    df = _ids([["CHEBI:9", None, None, None]])
+    source = _ids([
+        ["CHEBI:9", None, "HMDB0000002", None],
+        ["CHEBI:9", None, "HMDB0000003", None],
+        ["CHEBI:9", None, "HMDB0000003", None],
+    ])
+
+    out = reconcile(df, [source], on_conflict="majority")
+
+    assert out.ids.loc[0, "hmdb_id"] == "HMDB0000003"
+    assert out.conflicts.loc[0, "ids"] == ["HMDB0000003", "HMDB0000002"]